@@ -1,8 +1,24 @@
+from startup import timer, lazy_import
+import logging
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 import time
+import secrets
+import streamlit.components.v1 as components
 from connection import fetch_all_data, init_db_structure, insert_staff, insert_resident, insert_move, update_move_details, get_connection
+from db_layer import fetch_hot_data, fetch_moves_to_archive, mark_moves_archived, authenticate, merge_residents
+from db_layer import get_schema_version, set_schema_version, TIERING_SUPPORTED, MERGE_SUPPORTED
+from tiering import archive, start_rebalancer, ARCHIVE_AFTER_DAYS
+from state_backend import get_backend
+from dedup import ResidentIndex, split_batch
+from jobs import JobRunner, FINISHED, DONE
+from reports import summarize_moves
+from snapshot import save_snapshot, load_snapshot
+
+logger = logging.getLogger(__name__)
+
+# pandas só é importado quando uma tela realmente monta um DataFrame (login e warm-up não precisam)
+pd = lazy_import('pandas')
 
 # --- CONFIGURAÇÕES INICIAIS ---
 st.set_page_config(page_title="Telemim Mudanças", page_icon="🚛", layout="wide")
@@ -37,97 +53,313 @@ ROLES = {
     'HELPER': 'Ajudante'
 }
 
+# Lista de roles hardcoded (não está no DB)
+DEFAULT_ROLES = [
+    {'id': 1, 'name': 'Administrador', 'permission': 'ADMIN'},
+    {'id': 2, 'name': 'Secretária', 'permission': 'SECRETARY'},
+    {'id': 3, 'name': 'Supervisor', 'permission': 'SUPERVISOR'},
+    {'id': 4, 'name': 'Coordenador', 'permission': 'COORDINATOR'},
+    {'id': 5, 'name': 'Motorista', 'permission': 'DRIVER'}
+]
+
+# Tempo de vida do cache de dados compartilhado e das sessões de login (segundos)
+DATA_CACHE_TTL = 300
+SESSION_TTL = 12 * 3600
+SESSION_COOKIE = 'telemim_sid'
+
+# Incrementar sempre que init_db_structure mudar; com a mesma versão o DDL é pulado
+# 2: moves.archived e tabela app_meta (ver db_layer.py)
+SCHEMA_VERSION = 2
+
+@st.cache_resource
+def state_backend():
+    # Sessões, cache de dados e cargos personalizados ficam fora do processo para que
+    # várias réplicas do app possam atender o mesmo usuário (ver state_backend.py)
+    return get_backend()
+
+def get_roles():
+    custom = sorted(state_backend().items('roles').values(), key=lambda r: r['id'])
+    return list(DEFAULT_ROLES) + custom
+
+def get_data_version():
+    return state_backend().get('meta', 'data_version')
+
+def ensure_schema(conn):
+    # A versão fica no próprio DB: um backend de estado novo ou apagado não refaz o DDL,
+    # e um DB recriado sempre o recebe
+    if get_schema_version(conn) == SCHEMA_VERSION:
+        timer.record("DDL do esquema (pulado)", 0)
+        return
+    with timer.stage("DDL do esquema"):
+        init_db_structure(conn)
+    set_schema_version(conn, SCHEMA_VERSION)
+
+def invalidate_data(backend):
+    # Escrita feita fora de um rerun (tarefa, rebalanceador): cache e snapshot anteriores deixam de valer
+    backend.incr('meta', 'data_version')
+    backend.delete('cache', 'data')
+
+def publish_data(data, version, snapshot=True):
+    """Publica `data` no cache compartilhado (e no snapshot) marcado com `version`, a versão
+    lida *antes* da consulta ao DB: se outra escrita incrementar o marcador no meio tempo,
+    a cópia fica com a versão antiga e é descartada, em vez de passar por atual."""
+    state_backend().set('cache', 'data', {'version': version, 'data': data}, ttl=DATA_CACHE_TTL)
+    # Com o backend em memória o marcador de versão morre com o processo, e nenhum
+    # processo novo conseguiria validar (e usar) o snapshot
+    if snapshot and state_backend().persistent:
+        # Gravar o snapshot não precisa segurar o rerun
+        job_runner().submit("Snapshot dos dados", lambda ctx: save_snapshot(data, version))
+
+def strip_secrets(data):
+    # Senhas nunca saem do DB: nem para o session state, nem para o cache ou o snapshot
+    return dict(data, staff=[{k: v for k, v in s.items() if k != 'password'} for s in data.get('staff', [])])
+
+def prepare_data(data, version):
+    """Publica os dados do hot tier no cache compartilhado e anexa a lista de cargos."""
+    data = strip_secrets(data)
+    publish_data(data, version)
+    data = dict(data, roles=get_roles())
+    return data
+
+def load_data():
+    """Recarrega do DB após uma escrita; o marcador de versão invalida os snapshots anteriores."""
+    version = state_backend().incr('meta', 'data_version')
+    return prepare_data(fetch_hot_data(), version)
+
+def load_snapshot_data():
+    # Sem marcador no backend (ex.: backend em memória recém-criado) não há como validar
+    if not state_backend().persistent:
+        return None
+    version = get_data_version()
+    data = load_snapshot(version) if version is not None else None
+    if data is not None:
+        publish_data(data, version, snapshot=False)
+        data['roles'] = get_roles()
+    return data
+
+def load_cached_data():
+    cached = state_backend().get('cache', 'data')
+    if cached is None or cached.get('version') != get_data_version():
+        return None
+    data = cached['data']
+    data['roles'] = get_roles()
+    return data
+
+@st.cache_resource
+def archive_shared():
+    """Confere se este processo enxerga o mesmo arquivo de OS que as outras réplicas: a
+    primeira a chegar registra o id do seu diretório no backend compartilhado."""
+    local = archive.archive_id()
+    state_backend().add('meta', 'archive_id', local)
+    if state_backend().get('meta', 'archive_id') == local:
+        return True
+    logger.error("TELEMIM_ARCHIVE_DIR (%s) não é o diretório de arquivo compartilhado pelas demais réplicas; "
+                 "arquivamento desativado neste processo", archive.directory)
+    return False
+
+@st.cache_resource
+def tier_rebalancer():
+    # Um único job por processo mantém o arquivo em dia com as OS que esfriam com o tempo;
+    # as que saem do hot tier invalidam cache e snapshot. Uma réplica com arquivo próprio
+    # não arquiva: marcaria no DB OS que só o disco dela guarda.
+    if not TIERING_SUPPORTED or not archive_shared():
+        return None
+    backend = state_backend()
+    return start_rebalancer(fetch_moves_to_archive, mark_moves_archived, lambda ids: invalidate_data(backend))
+
+def seed_demo_data(ctx):
+    """Insere os dados iniciais de demonstração (tarefa em segundo plano, ver jobs.py).
+
+    Idempotente: o que já existe (mesmo email, mesmo morador, OS do morador) é pulado, então
+    uma carga interrompida no meio é completada pela próxima."""
+    def insert_missing_staff(staff):
+        existing = {s['email'].lower() for s in fetch_all_data()['staff']}
+        for s in staff:
+            if s['email'].lower() not in existing:
+                insert_staff(s['name'], s['email'], s['password'], s['role'], s['jobTitle'], s['secretaryId'], s['branchName'])
+
+    # Dados iniciais hardcoded (usados apenas para a primeira inicialização)
+    initial_staff = [
+        {'name': 'Admin Geral', 'email': 'admin@telemim.com', 'password': '123', 'role': 'ADMIN', 'jobTitle': 'Administrador', 'secretaryId': None, 'branchName': None},
+        {'name': 'Ana Secretária', 'email': 'ana@telemim.com', 'password': '123', 'role': 'SECRETARY', 'jobTitle': 'Secretária', 'secretaryId': None, 'branchName': 'Matriz'},
+    ]
+    
+    # Inserção de Staff (Admin e Secretária)
+    insert_missing_staff(initial_staff)
+    
+    ctx.progress(0.25, "Funcionários cadastrados")
+    
+    # Re-fetch para obter os IDs reais
+    data = fetch_all_data()
+    
+    # Mapeamento de IDs
+    staff_map = {s['name']: s['id'] for s in data['staff']}
+    ana_id = staff_map.get('Ana Secretária')
+    
+    # Inserção de Staff (Motorista e Supervisor) que dependem da Secretária
+    if ana_id:
+        initial_staff_linked = [
+            {'name': 'Carlos Motorista', 'email': 'carlos@telemim.com', 'password': '123', 'role': 'DRIVER', 'jobTitle': 'Motorista', 'secretaryId': ana_id, 'branchName': None},
+            {'name': 'Maria Supervisora', 'email': 'maria@telemim.com', 'password': '123', 'role': 'SUPERVISOR', 'jobTitle': 'Supervisor', 'secretaryId': ana_id, 'branchName': None}
+        ]
+        insert_missing_staff(initial_staff_linked)
+    
+    ctx.progress(0.5, "Equipe vinculada")
+    
+    # Re-fetch para obter os IDs reais atualizados
+    data = fetch_all_data()
+    staff_map = {s['name']: s['id'] for s in data['staff']}
+    ana_id = staff_map.get('Ana Secretária')
+    carlos_id = staff_map.get('Carlos Motorista')
+    maria_id = staff_map.get('Maria Supervisora')
+    
+    # Inserção de Residentes (depende do ID da Secretária)
+    if ana_id:
+        initial_resident = {
+            'name': 'João Silva', 'selo': 'A101', 'contact': '1199999999', 
+            'originAddress': 'Rua A, 100', 'destAddress': 'Rua B, 200', 'observation': 'Piano de cauda', 
+            'moveDate': '2023-12-01', 'moveTime': '08:00', 'secretaryId': ana_id,
+            'originNumber': 'S/N', 'originNeighborhood': 'Centro',
+            'destNumber': 'S/N', 'destNeighborhood': 'Bairro Novo'
+        }
+        if not any(r['name'] == initial_resident['name'] for r in fetch_all_data()['residents']):
+            insert_resident(initial_resident)
+        
+        ctx.progress(0.75, "Morador cadastrado")
+        
+        # Re-fetch para obter o ID do residente
+        data = fetch_all_data()
+        resident_map = {r['name']: r['id'] for r in data['residents']}
+        joao_id = resident_map.get('João Silva')
+        
+        # Inserção de Moves (depende dos IDs de Resident, Supervisor, Driver)
+        if joao_id and carlos_id and maria_id and not any(str(m['residentId']) == str(joao_id) for m in data['moves']):
+            initial_move = {
+                'residentId': joao_id, 'date': '2023-12-01', 'time': '08:00', 'metragem': 15.0, 
+                'supervisorId': maria_id, 'coordinatorId': None, 'driverId': carlos_id, 
+                'status': 'A realizar', 'secretaryId': ana_id, 'completionDate': None, 'completionTime': None
+            }
+            insert_move(initial_move)
+
+@st.cache_resource
+def job_runner():
+    # A limpeza periódica das tarefas também apaga sessões e cache vencidos do backend
+    return JobRunner(on_prune=state_backend().purge_expired)
+
+def bootstrap_job():
+    """Id da tarefa de carga inicial, iniciando-a se nenhuma estiver em andamento.
+
+    O id fica no backend compartilhado para que outras sessões (e réplicas) acompanhem a
+    mesma tarefa. Uma tarefa já finalizada com o banco vazio (ex.: banco recriado) não
+    serve: a próxima é disputada com add(), atômico, e só uma sessão a inicia."""
+    backend = state_backend()
+    current = backend.get('jobs', 'bootstrap')
+    job = job_runner().status(current) if current else None
+    if job is not None and job['status'] not in FINISHED:
+        return current
+    claim = f"bootstrap-after-{current}"
+    job_id = secrets.token_hex(16)
+    # O TTL libera a vaga se o processo que a ganhou morrer antes de iniciar a tarefa
+    if backend.add('jobs', claim, job_id, ttl=600):
+        job_runner().submit("Carga inicial", seed_demo_data, job_id=job_id)
+        backend.set('jobs', 'bootstrap', job_id)
+        return job_id
+    return backend.get('jobs', claim) or current
+
+# Reexecuta apenas o painel de progresso periodicamente, sem rerun da página inteira
+_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+
+def _job_panel(job_id, label, on_done, cancellable=True):
+    job = job_runner().status(job_id)
+    if job is None:
+        return
+    if job['status'] in FINISHED:
+        on_done(job)
+        return
+    st.progress(job['progress'], text=f"{label}: {job['message'] or job['status']}")
+    c1, c2 = st.columns(2)
+    if cancellable and c1.button("Cancelar", key=f"cancel_{job_id}"):
+        job_runner().cancel(job_id)
+    if _fragment is None:
+        c2.button("Atualizar", key=f"refresh_{job_id}")
+
+job_panel = _fragment(run_every=2)(_job_panel) if _fragment else _job_panel
+
 # --- INICIALIZAÇÃO DO BANCO DE DADOS E DADOS (SESSION STATE) ---
 if 'data' not in st.session_state:
-    conn = get_connection()
-    if conn:
-        # Inicializa a estrutura do DB se for a primeira vez
-        init_db_structure(conn)
+    # Outra sessão (ou réplica) já carregou os dados recentemente: reaproveita sem ir ao DB.
+    # Num processo recém-iniciado, tenta o snapshot local antes da carga completa.
+    cached = load_cached_data() or load_snapshot_data()
+    conn = get_connection() if cached is None else None
+    if cached is not None:
+        st.session_state.data = cached
+    elif conn:
+        # Inicializa a estrutura do DB se for a primeira vez (ou se o esquema mudou)
+        ensure_schema(conn)
         
         # Tenta buscar dados. Se não houver, insere os dados iniciais.
-        data = fetch_all_data()
+        # incr(0) lê a versão atual (criando o marcador se preciso) antes da consulta
+        version = state_backend().incr('meta', 'data_version', 0)
+        with timer.stage("Carga completa do DB"):
+            data = fetch_hot_data()
         
-        # Verifica se a tabela staff está vazia e insere dados iniciais se necessário
+        # Banco vazio: a carga inicial roda em segundo plano e a página acompanha o progresso
         if not data['staff']:
-            st.info("Banco de dados vazio. Inserindo dados iniciais de demonstração...")
-            
-            # Dados iniciais hardcoded (usados apenas para a primeira inicialização)
-            initial_staff = [
-                {'name': 'Admin Geral', 'email': 'admin@telemim.com', 'password': '123', 'role': 'ADMIN', 'jobTitle': 'Administrador', 'secretaryId': None, 'branchName': None},
-                {'name': 'Ana Secretária', 'email': 'ana@telemim.com', 'password': '123', 'role': 'SECRETARY', 'jobTitle': 'Secretária', 'secretaryId': None, 'branchName': 'Matriz'},
-            ]
-            
-            # Inserção de Staff (Admin e Secretária)
-            for s in initial_staff:
-                insert_staff(s['name'], s['email'], s['password'], s['role'], s['jobTitle'], s['secretaryId'], s['branchName'])
-            
-            # Re-fetch para obter os IDs reais
-            data = fetch_all_data()
-            
-            # Mapeamento de IDs
-            staff_map = {s['name']: s['id'] for s in data['staff']}
-            ana_id = staff_map.get('Ana Secretária')
-            
-            # Inserção de Staff (Motorista e Supervisor) que dependem da Secretária
-            if ana_id:
-                initial_staff_linked = [
-                    {'name': 'Carlos Motorista', 'email': 'carlos@telemim.com', 'password': '123', 'role': 'DRIVER', 'jobTitle': 'Motorista', 'secretaryId': ana_id, 'branchName': None},
-                    {'name': 'Maria Supervisora', 'email': 'maria@telemim.com', 'password': '123', 'role': 'SUPERVISOR', 'jobTitle': 'Supervisor', 'secretaryId': ana_id, 'branchName': None}
-                ]
-                for s in initial_staff_linked:
-                    insert_staff(s['name'], s['email'], s['password'], s['role'], s['jobTitle'], s['secretaryId'], s['branchName'])
-            
-            # Re-fetch para obter os IDs reais atualizados
-            data = fetch_all_data()
-            staff_map = {s['name']: s['id'] for s in data['staff']}
-            ana_id = staff_map.get('Ana Secretária')
-            carlos_id = staff_map.get('Carlos Motorista')
-            maria_id = staff_map.get('Maria Supervisora')
-            
-            # Inserção de Residentes (depende do ID da Secretária)
-            if ana_id:
-                initial_resident = {
-                    'name': 'João Silva', 'selo': 'A101', 'contact': '1199999999', 
-                    'originAddress': 'Rua A, 100', 'destAddress': 'Rua B, 200', 'observation': 'Piano de cauda', 
-                    'moveDate': '2023-12-01', 'moveTime': '08:00', 'secretaryId': ana_id,
-                    'originNumber': 'S/N', 'originNeighborhood': 'Centro',
-                    'destNumber': 'S/N', 'destNeighborhood': 'Bairro Novo'
-                }
-                insert_resident(initial_resident)
-                
-                # Re-fetch para obter o ID do residente
-                data = fetch_all_data()
-                resident_map = {r['name']: r['id'] for r in data['residents']}
-                joao_id = resident_map.get('João Silva')
-                
-                # Inserção de Moves (depende dos IDs de Resident, Supervisor, Driver)
-                if joao_id and carlos_id and maria_id:
-                    initial_move = {
-                        'residentId': joao_id, 'date': '2023-12-01', 'time': '08:00', 'metragem': 15.0, 
-                        'supervisorId': maria_id, 'coordinatorId': None, 'driverId': carlos_id, 
-                        'status': 'A realizar', 'secretaryId': ana_id, 'completionDate': None, 'completionTime': None
-                    }
-                    insert_move(initial_move)
-            
-            # Re-fetch final para carregar todos os dados no session state
-            data = fetch_all_data()
+            st.session_state.bootstrap_job = bootstrap_job()
             
-        # Adiciona a lista de roles hardcoded (não está no DB)
-        data['roles'] = [
-            {'id': 1, 'name': 'Administrador', 'permission': 'ADMIN'},
-            {'id': 2, 'name': 'Secretária', 'permission': 'SECRETARY'},
-            {'id': 3, 'name': 'Supervisor', 'permission': 'SUPERVISOR'},
-            {'id': 4, 'name': 'Coordenador', 'permission': 'COORDINATOR'},
-            {'id': 5, 'name': 'Motorista', 'permission': 'DRIVER'}
-        ]
-        
-        st.session_state.data = data
+            st.session_state.data = {'staff': [], 'residents': [], 'moves': [], 'roles': get_roles()}
+        else:
+            st.session_state.data = prepare_data(data, version)
     else:
         st.error("Não foi possível conectar ao banco de dados. Verifique suas credenciais em .streamlit/secrets.toml.")
         st.session_state.data = {'staff': [], 'residents': [], 'moves': [], 'roles': []} # Dados vazios para evitar erro
 
+# Inicia o rebalanceador uma vez por processo, qualquer que tenha sido a origem dos dados
+# (DB, cache ou snapshot)
+tier_rebalancer()
+
+def get_session_cookie():
+    context = getattr(st, 'context', None)
+    return context.cookies.get(SESSION_COOKIE) if context is not None else None
+
+def write_session_cookie(value):
+    # O Streamlit não define cookies pelo servidor; o script roda no iframe do componente.
+    # Por isso o cookie NÃO é HttpOnly: um script injetado na página consegue ler o token de
+    # sessão. Mitigações: token aleatório de 192 bits, SameSite=Strict, Secure sob HTTPS e
+    # TTL de SESSION_TTL. Para HttpOnly, o cookie teria de ser definido pelo proxy reverso
+    # (ou por um endpoint próprio) na resposta HTTP, não por este componente.
+    max_age = SESSION_TTL if value else 0
+    components.html(
+        "<script>parent.document.cookie = "
+        f"'{SESSION_COOKIE}={value}; path=/; max-age={max_age}; SameSite=Strict'"
+        " + (parent.location.protocol === 'https:' ? '; Secure' : '');</script>",
+        height=0
+    )
+
 if 'user' not in st.session_state:
     st.session_state.user = None
+    # Restaura o login a partir do cookie de sessão (a sessão pode ter começado em outra réplica)
+    sid = get_session_cookie()
+    session = state_backend().get('sessions', sid) if sid else None
+    if session:
+        st.session_state.session_id = sid
+        st.session_state.user = next((s for s in st.session_state.data['staff'] if str(s['id']) == str(session['userId'])), None)
+
+# Cookie pendente do login/logout da rerun anterior
+if 'pending_cookie' in st.session_state:
+    write_session_cookie(st.session_state.pop('pending_cookie'))
+
+def _on_bootstrap_done(job):
+    st.session_state.pop('bootstrap_job', None)
+    if job['status'] != DONE:
+        st.error(f"Falha na carga inicial: {job['error'] or job['status']}")
+        return
+    st.session_state.data = load_data()
+    st.rerun()
+
+if st.session_state.get('bootstrap_job'):
+    st.info("Banco de dados vazio. Inserindo dados iniciais de demonstração...")
+    job_panel(st.session_state.bootstrap_job, "Carga inicial", _on_bootstrap_done, cancellable=False)
 
 # --- FUNÇÕES AUXILIARES ---
 
@@ -147,6 +379,39 @@ def get_name_by_id(data_list, id_val):
     item = next((x for x in data_list if str(x['id']) == str(id_val)), None)
     return item['name'] if item else 'N/A'
 
+def select_secretary(label="Vincular à Secretária", key=None):
+    """Secretária dona do registro: a do usuário logado ou, para o Admin, a escolhida no selectbox."""
+    sec_id = get_current_scope_id()
+    if st.session_state.user['role'] == 'ADMIN':
+        secretaries = [s for s in st.session_state.data['staff'] if s['role'] == 'SECRETARY']
+        
+        # Corrigindo o KeyError: Usar o nome da secretária se branchName for None
+        sec_options = {}
+        for s in secretaries:
+            sec_options[s.get('branchName') or s['name']] = s['id']
+            
+        selected_sec_name = st.selectbox(label, list(sec_options.keys()), key=key)
+        if selected_sec_name: sec_id = sec_options[selected_sec_name]
+    return sec_id
+
+def scoped_residents(sec_id=None):
+    residents = filter_by_scope(st.session_state.data['residents'])
+    if sec_id is None: return residents
+    return [r for r in residents if str(r.get('secretaryId')) == str(sec_id)]
+
+def get_resident_index(sec_id=None):
+    # Só entram os moradores que o usuário pode ver (e, se informada, da secretária do
+    # novo cadastro). Reconstruído apenas quando a lista de moradores é recarregada.
+    residents = st.session_state.data['residents']
+    cached = st.session_state.get('resident_index')
+    if cached is None or cached[0] is not residents:
+        cached = (residents, {})
+        st.session_state.resident_index = cached
+    key = None if sec_id is None else str(sec_id)
+    if key not in cached[1]:
+        cached[1][key] = ResidentIndex(scoped_residents(sec_id))
+    return cached[1][key]
+
 # --- TELA DE LOGIN ---
 def login_screen():
     st.markdown("<h1 style='text-align: center; color: #2563eb;'>🚛 TELEMIM</h1>", unsafe_allow_html=True)
@@ -160,11 +425,14 @@ def login_screen():
             submit = st.form_submit_button("Entrar")
             
             if submit:
-                user = next((u for u in st.session_state.data['staff'] if u['email'].lower() == email.lower() and u['password'] == password), None)
+                # A senha é conferida no DB; o session state só guarda a equipe sem senhas
+                user = authenticate(email, password)
                 if user:
-                    st.session_state.user = user
-                    st.success(f"Bem-vindo, {user['name']}!")
-                    time.sleep(1)
+                    st.session_state.user = {k: v for k, v in user.items() if k != 'password'}
+                    sid = secrets.token_urlsafe(24)
+                    state_backend().set('sessions', sid, {'userId': user['id']}, ttl=SESSION_TTL)
+                    st.session_state.session_id = sid
+                    st.session_state.pending_cookie = sid
                     st.rerun()
                 else:
                     st.error("Credenciais inválidas.")
@@ -223,6 +491,7 @@ def dashboard():
         st.session_state.dashboard_filter_status = f_status
         
     f_date = c3.date_input("Data", value=None)
+    f_archive = st.checkbox(f"Incluir arquivo (OS concluídas há mais de {ARCHIVE_AFTER_DAYS} dias)", key="dashboard_include_archive")
     
     # Aplicar Filtros
     filtered = moves
@@ -232,6 +501,16 @@ def dashboard():
         filtered = [m for m in filtered if m['date'] == str(f_date)]
     if f_name:
         filtered = [m for m in filtered if f_name.lower() in get_name_by_id(st.session_state.data['residents'], m['residentId']).lower()]
+    
+    # O arquivo só é lido quando solicitado; os KPIs acima usam apenas o hot tier
+    if f_archive:
+        if not archive_shared():
+            st.warning("Este servidor não enxerga o arquivo de OS compartilhado; OS arquivadas podem faltar.")
+        filtered = filtered + archive.query(
+            name=f_name, status=st.session_state.dashboard_filter_status,
+            start=f_date, end=f_date, scope=scope_id,
+            residents=st.session_state.data['residents'], exclude_ids=[m['id'] for m in moves]
+        )
 
     # Exibir Tabela Simplificada
     if filtered:
@@ -288,6 +567,16 @@ def manage_moves():
             use_container_width=True
         )
         
+        # Edições enviadas por automação (ex.: teste de carga) passam pelo mesmo salvamento
+        # que as feitas na tabela; formato {id da OS: {coluna: valor}}
+        pending = st.session_state.pop('pending_move_edits', None)
+        if pending:
+            edited_df = edited_df.copy()
+            for move_id, changes in pending.items():
+                mask = edited_df['id'].astype(str) == str(move_id)
+                for col, value in changes.items():
+                    edited_df.loc[mask, col] = value
+        
         # Save changes back to database
         if not df.equals(edited_df):
             success = True
@@ -318,11 +607,44 @@ def manage_moves():
             
             if success:
                 # Re-fetch para atualizar o session state com os dados do DB
-                st.session_state.data = fetch_all_data()
+                st.session_state.data = load_data()
                 st.success("Alterações salvas automaticamente no banco de dados!")
     else:
         st.info("Nenhuma Ordem de Serviço encontrada.")
 
+def import_residents(ctx, rows, residents, backend):
+    """Tarefa de importação em lote: descarta duplicados e insere o restante."""
+    # Índice novo para não sujar o índice da sessão com as linhas do arquivo
+    unique, duplicates = split_batch(rows, ResidentIndex(residents))
+    inserted = 0
+    try:
+        for i, row in enumerate(unique):
+            if insert_resident(row):
+                inserted += 1
+            ctx.progress((i + 1) / len(unique), f"{i + 1}/{len(unique)} moradores")
+    finally:
+        # Mesmo cancelada, o que já entrou no DB invalida o cache; não depende da sessão
+        # que iniciou a tarefa continuar aberta para ver o fim dela
+        if inserted:
+            invalidate_data(backend)
+    return {
+        'inserted': inserted,
+        'duplicates': [
+            {'Linha': row['name'], 'Similar a': match['name'], 'id existente': match.get('id'), 'Similaridade': f"{score:.0%}"}
+            for row, (score, match) in duplicates
+        ],
+    }
+
+def _on_import_done(job):
+    st.session_state.pop('import_job', None)
+    if job['status'] == DONE:
+        st.session_state.import_result = job['result']
+    else:
+        st.session_state.import_result = None
+        st.error(f"Importação interrompida: {job['error'] or job['status']}")
+    st.session_state.data = load_data()
+    st.rerun()
+
 def residents_form():
     st.title("🏠 Cadastro de Moradores")
     
@@ -353,21 +675,9 @@ def residents_form():
         move_time = c8.time_input("Hora")
         
         # Admin select secretary logic
-        user = st.session_state.user
-        sec_id = get_current_scope_id()
-        
-        if user['role'] == 'ADMIN':
-            secretaries = [s for s in st.session_state.data['staff'] if s['role'] == 'SECRETARY']
-            
-            # Corrigindo o KeyError: Usar o nome da secretária se branchName for None
-            sec_options = {}
-            for s in secretaries:
-                key = s.get('branchName') or s['name']
-                sec_options[key] = s['id']
-                
-            selected_sec_name = st.selectbox("Vincular à Secretária", list(sec_options.keys()))
-            if selected_sec_name: sec_id = sec_options[selected_sec_name]
+        sec_id = select_secretary()
 
+        force = st.checkbox("Cadastrar mesmo se houver possível duplicidade")
         submit = st.form_submit_button("Salvar Morador")
         
         if submit:
@@ -381,12 +691,81 @@ def residents_form():
                     'observation': obs, 'moveDate': str(move_date), 'moveTime': str(move_time),
                     'secretaryId': sec_id
                 }
-                if insert_resident(new_res):
+                matches = [] if force else get_resident_index(sec_id).find_duplicates(new_res)
+                if matches:
+                    st.warning("Possível morador duplicado. Confira abaixo ou marque a opção para cadastrar mesmo assim.")
+                    st.dataframe(pd.DataFrame([
+                        {'Similaridade': f"{score:.0%}", 'id': r['id'], 'Nome': r['name'], 'Selo': r.get('selo'),
+                         'Telefone': r.get('contact'), 'Bairro': r.get('originNeighborhood')}
+                        for score, r in matches
+                    ]), use_container_width=True, hide_index=True)
+                elif insert_resident(new_res):
                     # Atualiza o session state após a inserção no DB
-                    st.session_state.data = fetch_all_data()
+                    st.session_state.data = load_data()
                     st.success("Morador cadastrado com sucesso!")
                 else:
                     st.error("Erro ao cadastrar morador no banco de dados.")
+    
+    st.subheader("📥 Importação em Lote")
+    upload = st.file_uploader("Planilha CSV de moradores", type=["csv"],
+                              help="Colunas: name, selo, contact, originAddress, originNumber, originNeighborhood, destAddress, destNumber, destNeighborhood, observation")
+    import_sec_id = select_secretary(key='import_secretary')
+    if upload is not None and st.button("Importar Moradores"):
+        rows = pd.read_csv(upload, dtype=str).fillna('').to_dict('records')
+        rows = [dict(r, secretaryId=import_sec_id) for r in rows if r.get('name')]
+        st.session_state.import_job = job_runner().submit(
+            "Importação de moradores", import_residents, rows, scoped_residents(import_sec_id), state_backend(),
+            owner=str(st.session_state.user['id'])
+        )
+    
+    if st.session_state.get('import_job'):
+        job_panel(st.session_state.import_job, "Importando moradores", _on_import_done)
+    
+    result = st.session_state.get('import_result')
+    if result:
+        st.success(f"{result['inserted']} morador(es) importado(s).")
+        if result['duplicates']:
+            st.warning(f"{len(result['duplicates'])} linha(s) ignorada(s) por possível duplicidade.")
+            st.dataframe(pd.DataFrame(result['duplicates']), use_container_width=True, hide_index=True)
+    
+    if st.session_state.user['role'] == 'ADMIN':
+        st.subheader("🧹 Mesclar Duplicados")
+        if not MERGE_SUPPORTED:
+            st.caption("Indisponível: o módulo do banco de dados não implementa merge_residents.")
+        elif st.button("Procurar Duplicados"):
+            st.session_state.duplicate_groups = get_resident_index().duplicate_groups()
+        groups = st.session_state.get('duplicate_groups')
+        if groups is not None and not groups:
+            st.info("Nenhum grupo de moradores duplicados encontrado.")
+        elif groups:
+            # Nada é removido sem confirmação: o Admin marca, membro a membro, quais cadastros
+            # são mesmo o mesmo morador do cadastro mantido
+            selected = []
+            for group in groups:
+                survivor = group[0]
+                st.markdown(f"**Manter #{survivor['id']} {survivor['name']}** — Selo: {survivor.get('selo') or '-'}, "
+                            f"Telefone: {survivor.get('contact') or '-'}, Bairro: {survivor.get('originNeighborhood') or '-'}")
+                members = st.data_editor(pd.DataFrame([
+                    {'Mesclar': False, 'id': r['id'], 'Nome': r['name'], 'Selo': r.get('selo'), 'Telefone': r.get('contact'),
+                     'Bairro': r.get('originNeighborhood')}
+                    for r in group[1:]
+                ]), disabled=['id', 'Nome', 'Selo', 'Telefone', 'Bairro'], hide_index=True, use_container_width=True,
+                    key=f"merge_group_{survivor['id']}")
+                duplicate_ids = [r['id'] for r, chosen in zip(group[1:], members['Mesclar']) if chosen]
+                if duplicate_ids:
+                    selected.append((survivor['id'], duplicate_ids))
+            total = sum(len(ids) for _, ids in selected)
+            if st.button(f"Mesclar {total} cadastro(s) selecionado(s)", disabled=not selected):
+                removed = 0
+                for survivor_id, duplicate_ids in selected:
+                    if merge_residents(survivor_id, duplicate_ids):
+                        archive.repoint_resident(survivor_id, duplicate_ids)
+                        removed += len(duplicate_ids)
+                    else:
+                        st.error(f"Erro ao mesclar o grupo do morador #{survivor_id} no banco de dados.")
+                st.session_state.data = load_data()
+                st.session_state.duplicate_groups = None
+                st.success(f"{removed} cadastro(s) duplicado(s) removido(s); OS repontadas para o cadastro mantido.")
 
 def schedule_form():
     st.title("🗓️ Agendamento de OS")
@@ -461,7 +840,7 @@ def schedule_form():
                 }
                 
                 if insert_move(new_move):
-                    st.session_state.data = fetch_all_data()
+                    st.session_state.data = load_data()
                     st.success("Ordem de Serviço agendada com sucesso!")
                 else:
                     st.error("Erro ao agendar Ordem de Serviço no banco de dados.")
@@ -502,7 +881,7 @@ def staff_management():
                 role_permission = role_map[role_name]['permission']
                 if insert_staff(name, email, password or '123', role_permission, role_name, sec_id):
                     # Atualiza o session state após a inserção no DB
-                    st.session_state.data = fetch_all_data()
+                    st.session_state.data = load_data()
                     st.success("Usuário criado!")
                 else:
                     st.error("Erro ao cadastrar funcionário no banco de dados.")
@@ -561,7 +940,7 @@ def staff_management():
                         st.error(f"Erro ao atualizar funcionário {name} (ID: {staff_id}).")
                         
                 # Atualiza o session state após o salvamento
-                st.session_state.data = fetch_all_data()
+                st.session_state.data = load_data()
                 st.rerun()
                 
             except Exception as e:
@@ -578,7 +957,7 @@ def manage_secretaries():
         if name:
             login = name.lower().replace(" ", "") + "@telemim.com"
             if insert_staff(name, login, '123', 'SECRETARY', 'Secretária', None, name):
-                st.session_state.data = fetch_all_data()
+                st.session_state.data = load_data()
                 new_sec = next((s for s in st.session_state.data['staff'] if s['email'] == login), None)
                 if new_sec and new_sec.get('secretaryId') is None:
                     st.success(f"Criado! Login automático: {login} / Senha: 123. (Lembre-se de configurar o secretaryId no DB se necessário para escopo)")
@@ -591,7 +970,69 @@ def manage_secretaries():
 
 def reports_page():
     st.title("📈 Relatórios e Análises")
-    st.info("Funcionalidade em desenvolvimento. Aqui você poderá gerar relatórios de OS, desempenho da equipe e exportar dados.")
+    
+    st.subheader("📚 Histórico de OS")
+    c1, c2, c3 = st.columns(3)
+    f_name = c1.text_input("Nome do Cliente", key="report_name")
+    f_start = c2.date_input("De", value=None, key="report_start")
+    f_end = c3.date_input("Até", value=None, key="report_end")
+    f_archive = st.checkbox("Incluir OS arquivadas", value=True, key="report_include_archive")
+    
+    residents = st.session_state.data['residents']
+    moves = filter_by_scope(st.session_state.data['moves'])
+    if f_start:
+        moves = [m for m in moves if str(m['date']) >= str(f_start)]
+    if f_end:
+        moves = [m for m in moves if str(m['date']) <= str(f_end)]
+    if f_name:
+        moves = [m for m in moves if f_name.lower() in get_name_by_id(residents, m['residentId']).lower()]
+    if f_archive:
+        if not archive_shared():
+            st.warning("Este servidor não enxerga o arquivo de OS compartilhado; OS arquivadas podem faltar.")
+        moves = moves + archive.query(name=f_name, start=f_start, end=f_end, scope=get_current_scope_id(), residents=residents,
+                                      exclude_ids=[m['id'] for m in st.session_state.data['moves']])
+    
+    if moves:
+        df = pd.DataFrame(moves)
+        df['Cliente'] = df['residentId'].apply(lambda x: get_name_by_id(residents, x))
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total de OS", len(df))
+        col2.metric("Concluídas", int((df['status'] == 'Concluído').sum()))
+        col3.metric("Volume Total (m³)", f"{pd.to_numeric(df['metragem'], errors='coerce').fillna(0).sum():.2f}")
+        
+        st.dataframe(df[['id', 'date', 'Cliente', 'status', 'metragem', 'completionDate']], use_container_width=True, hide_index=True)
+    else:
+        st.warning("Nenhuma OS encontrada no período.")
+    
+    st.subheader("🧮 Consolidado por Secretaria")
+    # A consolidação roda no pool de processos; a página continua respondendo enquanto isso
+    if st.button("Gerar Consolidado", disabled=not moves):
+        st.session_state.report_job = job_runner().submit(
+            "Consolidado de OS", summarize_moves, moves, st.session_state.data['staff'],
+            cpu=True, owner=str(st.session_state.user['id'])
+        )
+    if st.session_state.get('report_job'):
+        job_panel(st.session_state.report_job, "Gerando consolidado", _on_report_done)
+    if st.session_state.get('report_summary'):
+        st.dataframe(pd.DataFrame(st.session_state.report_summary), use_container_width=True, hide_index=True)
+    
+    st.subheader("⚙️ Tarefas Recentes")
+    jobs = job_runner().list_jobs(owner=str(st.session_state.user['id']))
+    if jobs:
+        df_jobs = pd.DataFrame(jobs)
+        df_jobs['created'] = pd.to_datetime(df_jobs['created'], unit='s')
+        st.dataframe(df_jobs[['name', 'status', 'progress', 'message', 'created']], use_container_width=True, hide_index=True)
+    else:
+        st.info("Nenhuma tarefa executada.")
+
+def _on_report_done(job):
+    st.session_state.pop('report_job', None)
+    if job['status'] == DONE:
+        st.session_state.report_summary = job['result']
+    else:
+        st.error(f"Falha ao gerar consolidado: {job['error'] or job['status']}")
+    st.rerun()
 
 def manage_roles():
     st.title("🛡️ Cargos")
@@ -604,7 +1045,10 @@ def manage_roles():
         if submit:
             if name:
                 perm_key = next(key for key, value in ROLES.items() if value == perm)
-                st.session_state.data['roles'].append({'id': int(time.time()), 'name': name, 'permission': perm_key})
+                role = {'id': int(time.time()), 'name': name, 'permission': perm_key}
+                # Persiste no backend compartilhado para que todas as sessões/réplicas vejam o cargo
+                state_backend().set('roles', str(role['id']), role)
+                st.session_state.data['roles'] = get_roles()
                 st.success("Cargo criado.")
             
     st.table(pd.DataFrame(st.session_state.data['roles']))
@@ -649,7 +1093,20 @@ else:
         st.title(f"Olá, {user['name']}")
         st.caption(f"Cargo: {user.get('jobTitle', 'N/A')}")
         
+        if user['role'] == 'ADMIN':
+            with st.expander("⏱️ Inicialização do servidor"):
+                stages = timer.report()
+                if stages:
+                    st.dataframe(pd.DataFrame(stages), hide_index=True, use_container_width=True)
+                else:
+                    st.caption("Processo iniciado a partir do cache compartilhado.")
+        
         if st.button("Sair", type="primary"):
+            # O cookie lido no início da conexão não inclui um login feito nesta mesma aba
+            sid = st.session_state.pop('session_id', None) or get_session_cookie()
+            if sid:
+                state_backend().delete('sessions', sid)
+            st.session_state.pending_cookie = ''
             st.session_state.user = None
             st.rerun()
             
@@ -0,0 +1,87 @@
+import logging
+
+import connection
+
+logger = logging.getLogger(__name__)
+
+# --- FUNÇÕES DO DB USADAS PELOS RECURSOS NOVOS ---
+# O app.py importa daqui (e não direto do connection.py) as funções que as versões atuais
+# do módulo do DB ainda não definem. Se o connection.py define a função, ela é usada como
+# está; senão, entra uma versão montada sobre a API existente (fetch_all_data & cia.) e o
+# recurso correspondente fica desligado ou degradado, sem quebrar o import do app.
+#
+# O que o connection.py precisa implementar para a versão 2 do esquema (SCHEMA_VERSION
+# no app.py). init_db_structure deve ser idempotente, pois roda de novo a cada versão:
+#
+#   ALTER TABLE moves ADD COLUMN IF NOT EXISTS archived BOOLEAN NOT NULL DEFAULT FALSE;
+#   CREATE INDEX IF NOT EXISTS moves_archived_idx ON moves (archived, status);
+#   CREATE TABLE IF NOT EXISTS app_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+#
+#   fetch_hot_data()                   -> como fetch_all_data(), só com moves.archived = FALSE
+#   fetch_moves_to_archive(before)     -> OS não arquivadas, status 'Concluído' e
+#                                         COALESCE(completionDate, date) < before
+#   mark_moves_archived(ids)           -> UPDATE moves SET archived = TRUE WHERE id IN ids
+#                                         (update_move_details volta archived para FALSE
+#                                         quando o status deixa de ser 'Concluído')
+#   authenticate(email, password)      -> linha de staff (email sem diferenciar maiúsculas) ou None
+#   merge_residents(survivor, dups)    -> numa transação: UPDATE moves SET residentId = survivor
+#                                         WHERE residentId IN dups; DELETE FROM residents
+#                                         WHERE id IN dups
+#   get_schema_version(conn)           -> int(app_meta['schema_version']) ou None
+#   set_schema_version(conn, version)  -> grava app_meta['schema_version']
+#
+# loadtest/fake_connection.py implementa todas elas e serve de referência de comportamento.
+
+
+def _native(name):
+    return getattr(connection, name, None)
+
+
+# Arquivamento só faz sentido com a coluna moves.archived: sem ela o hot tier traz tudo
+TIERING_SUPPORTED = bool(_native('fetch_moves_to_archive') and _native('mark_moves_archived'))
+MERGE_SUPPORTED = _native('merge_residents') is not None
+
+if not TIERING_SUPPORTED:
+    logger.warning("connection.py sem fetch_moves_to_archive/mark_moves_archived: arquivamento de OS desativado")
+
+
+def fetch_hot_data():
+    native = _native('fetch_hot_data')
+    if native:
+        return native()
+    data = connection.fetch_all_data()
+    return dict(data, moves=[m for m in data.get('moves', []) if not m.get('archived')])
+
+
+def fetch_moves_to_archive(before_date):
+    return _native('fetch_moves_to_archive')(before_date) if TIERING_SUPPORTED else []
+
+
+def mark_moves_archived(move_ids):
+    return _native('mark_moves_archived')(move_ids) if TIERING_SUPPORTED else False
+
+
+def authenticate(email, password):
+    native = _native('authenticate')
+    if native:
+        return native(email, password)
+    staff = connection.fetch_all_data().get('staff', [])
+    return next((s for s in staff if s['email'].lower() == email.lower() and s['password'] == password), None)
+
+
+def merge_residents(survivor_id, duplicate_ids):
+    if not MERGE_SUPPORTED:
+        logger.error("connection.py sem merge_residents: mescla de moradores indisponível")
+        return False
+    return _native('merge_residents')(survivor_id, duplicate_ids)
+
+
+def get_schema_version(conn):
+    # Sem onde guardar a versão, o DDL roda a cada carga, como antes do controle de versão
+    native = _native('get_schema_version')
+    return native(conn) if native else None
+
+
+def set_schema_version(conn, version):
+    native = _native('set_schema_version')
+    return native(conn, version) if native else False
@@ -0,0 +1,194 @@
+import re
+import unicodedata
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+# --- DETECÇÃO DE MORADORES DUPLICADOS ---
+# Cada morador é indexado por "chaves de bloqueio" baratas (telefone normalizado, selo,
+# tokens do nome sem acento, bairro). Uma consulta só compara o novo registro com os
+# moradores que compartilham ao menos uma chave, então o custo não cresce com a tabela.
+
+DUPLICATE_THRESHOLD = 0.75
+
+# Blocos muito grandes (ex.: nomes muito comuns) não ajudam a separar candidatos
+MAX_BLOCK_SIZE = 500
+
+# Peso de cada campo no score; campos vazios em um dos registros não entram na conta
+FIELD_WEIGHTS = {'name': 0.55, 'phone': 0.25, 'selo': 0.12, 'neighborhood': 0.08}
+
+# O nome precisa bater por conta própria: telefone e bairro iguais são comuns entre
+# pessoas da mesma casa ("João Silva" x "Maria da Silva") e não bastam para um duplicado
+MIN_NAME_SIMILARITY = 0.7
+MIN_FIRST_NAME_SIMILARITY = 0.8
+
+NAME_STOPWORDS = {'de', 'da', 'do', 'das', 'dos', 'e'}
+
+
+def strip_accents(text):
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def normalize_phone(value):
+    """Mantém os últimos 8 dígitos: ignora +55, DDD, zero de discagem e o nono dígito."""
+    digits = re.sub(r'\D', '', str(value or ''))
+    return digits[-8:] if len(digits) >= 8 else ''
+
+
+def normalize_selo(value):
+    return re.sub(r'[^A-Z0-9]', '', strip_accents(str(value or '')).upper())
+
+
+def normalize_text(value):
+    return ' '.join(re.findall(r'[a-z0-9]+', strip_accents(str(value or '')).lower()))
+
+
+def name_tokens(value):
+    return [t for t in normalize_text(value).split() if t not in NAME_STOPWORDS and len(t) > 1]
+
+
+def _features(resident):
+    tokens = name_tokens(resident.get('name'))
+    return {
+        'name': ' '.join(tokens),
+        'tokens': tokens,
+        'phone': normalize_phone(resident.get('contact')),
+        'selo': normalize_selo(resident.get('selo')),
+        'neighborhood': normalize_text(resident.get('originNeighborhood')),
+    }
+
+
+def blocking_keys(features):
+    keys = set()
+    if features['phone']:
+        keys.add('tel:' + features['phone'])
+    if features['selo']:
+        keys.add('selo:' + features['selo'])
+    tokens = features['tokens']
+    if tokens:
+        # Primeiro + último nome pega variações no meio ("Maria S. Souza" x "Maria Souza")
+        keys.add(f"nome:{tokens[0]}|{tokens[-1]}")
+        if features['neighborhood']:
+            keys.add(f"bairro:{features['neighborhood']}|{tokens[0]}")
+    return keys
+
+
+def similarity(a, b):
+    """Score entre 0 e 1 para dois conjuntos de features. É 0 quando os nomes, ou só os
+    primeiros nomes, são diferentes demais, mesmo que os outros campos coincidam."""
+    if not a['tokens'] or not b['tokens']:
+        return 0.0
+    if SequenceMatcher(None, a['tokens'][0], b['tokens'][0]).ratio() < MIN_FIRST_NAME_SIMILARITY:
+        return 0.0
+    name_score = SequenceMatcher(None, a['name'], b['name']).ratio()
+    if name_score < MIN_NAME_SIMILARITY:
+        return 0.0
+    total = score = 0.0
+    for field, weight in FIELD_WEIGHTS.items():
+        if not a[field] or not b[field]:
+            continue
+        total += weight
+        if field == 'name':
+            score += weight * name_score
+        elif a[field] == b[field]:
+            score += weight
+    return score / total if total else 0.0
+
+
+class ResidentIndex:
+    """Índice de bloqueio em memória sobre a lista de moradores."""
+
+    def __init__(self, residents=()):
+        self._blocks = defaultdict(set)
+        self._features = {}
+        self._residents = {}
+        for r in residents:
+            self.add(r)
+
+    def __len__(self):
+        return len(self._residents)
+
+    def add(self, resident):
+        key = str(resident.get('id', f"novo-{len(self._residents)}"))
+        features = _features(resident)
+        self._residents[key] = resident
+        self._features[key] = features
+        for block in blocking_keys(features):
+            self._blocks[block].add(key)
+        return key
+
+    def remove(self, resident_id):
+        key = str(resident_id)
+        features = self._features.pop(key, None)
+        self._residents.pop(key, None)
+        if features:
+            for block in blocking_keys(features):
+                self._blocks[block].discard(key)
+
+    def candidates(self, features):
+        keys = set()
+        for block in blocking_keys(features):
+            members = self._blocks.get(block, ())
+            if len(members) <= MAX_BLOCK_SIZE:
+                keys.update(members)
+        return keys
+
+    def find_duplicates(self, resident, threshold=DUPLICATE_THRESHOLD, limit=5, exclude=None):
+        """Retorna [(score, morador)] dos possíveis duplicados, do mais provável ao menos."""
+        features = _features(resident)
+        matches = []
+        for key in self.candidates(features):
+            if exclude is not None and key == str(exclude):
+                continue
+            score = similarity(features, self._features[key])
+            if score >= threshold:
+                matches.append((score, self._residents[key]))
+        matches.sort(key=lambda m: m[0], reverse=True)
+        return matches[:limit]
+
+    def duplicate_groups(self, threshold=DUPLICATE_THRESHOLD):
+        """Agrupa os moradores já cadastrados em grupos de duplicados.
+
+        O primeiro de cada grupo é o sobrevivente (cadastro mais antigo) e cada membro
+        precisa atingir o `threshold` diretamente contra ele, dentro da mesma secretaria.
+        Sem transitividade, um "Maria Silva" sem telefone não encadeia pessoas diferentes."""
+        assigned = set()
+        groups = []
+        for key in sorted(self._residents, key=_id_order):
+            if key in assigned:
+                continue
+            survivor = self._features[key]
+            secretary = str(self._residents[key].get('secretaryId'))
+            members = []
+            for other in self.candidates(survivor):
+                if other == key or other in assigned:
+                    continue
+                if str(self._residents[other].get('secretaryId')) != secretary:
+                    continue
+                score = similarity(survivor, self._features[other])
+                if score >= threshold:
+                    members.append((score, other))
+            if members:
+                members.sort(key=lambda m: (-m[0], _id_order(m[1])))
+                assigned.add(key)
+                assigned.update(other for _, other in members)
+                groups.append([self._residents[key]] + [self._residents[other] for _, other in members])
+        return groups
+
+
+def _id_order(key):
+    # Ids numéricos em ordem numérica (o menor é o cadastro mais antigo)
+    return (0, int(key), '') if key.isdigit() else (1, 0, key)
+
+
+def split_batch(rows, index, threshold=DUPLICATE_THRESHOLD):
+    """Separa uma importação em lote em (novos, duplicados). Cada linha aceita entra no
+    índice, então duplicados dentro do próprio arquivo também são detectados."""
+    unique, duplicates = [], []
+    for row in rows:
+        matches = index.find_duplicates(row, threshold, limit=1)
+        if matches:
+            duplicates.append((row, matches[0]))
+        else:
+            index.add(row)
+            unique.append(row)
+    return unique, duplicates
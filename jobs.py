@@ -0,0 +1,241 @@
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from state_backend import STATE_PATH
+
+# --- EXECUTOR DE TAREFAS EM SEGUNDO PLANO ---
+# Operações lentas (carga inicial, importações, relatórios) rodam fora da thread do
+# script do Streamlit. O estado de cada tarefa fica numa tabela SQLite, então qualquer
+# rerun (ou réplica) consegue consultar progresso e resultado sem bloquear a página.
+
+JOBS_PATH = os.environ.get('TELEMIM_JOBS_PATH', STATE_PATH)
+JOB_THREADS = int(os.environ.get('TELEMIM_JOB_THREADS', '4'))
+JOB_PROCESSES = int(os.environ.get('TELEMIM_JOB_PROCESSES', str(os.cpu_count() or 1)))
+# Tarefas finalizadas há mais de JOB_RETENTION_DAYS dias são apagadas da tabela
+JOB_RETENTION_DAYS = float(os.environ.get('TELEMIM_JOB_RETENTION_DAYS', '7'))
+PRUNE_EVERY = 100  # submissões entre duas limpezas
+
+QUEUED = 'Na fila'
+RUNNING = 'Executando'
+DONE = 'Concluída'
+FAILED = 'Falhou'
+CANCELLED = 'Cancelada'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """Passado como primeiro argumento às tarefas de thread para reportar progresso."""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.job_id = job_id
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def progress(self, fraction, message=None):
+        """Atualiza o progresso (0 a 1) e interrompe a tarefa se ela foi cancelada."""
+        self.runner._update(self.job_id, progress=max(0.0, min(1.0, fraction)), message=message)
+        self.check_cancelled()
+
+
+class JobRunner:
+
+    def __init__(self, path=JOBS_PATH, threads=JOB_THREADS, processes=JOB_PROCESSES, on_prune=None):
+        self.path = path
+        # Chamado a cada limpeza; o app o usa para limpar também o backend de estado
+        self.on_prune = on_prune
+        self._local = threading.local()
+        self._threads = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='telemim-job')
+        self._process_count = processes
+        self._processes = None
+        self._futures = {}
+        self._contexts = {}
+        self._lock = threading.Lock()
+        self._submitted = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, name TEXT NOT NULL, owner TEXT, worker TEXT, status TEXT NOT NULL,"
+            " progress REAL NOT NULL DEFAULT 0, message TEXT, result TEXT, error TEXT,"
+            " created REAL NOT NULL, started REAL, finished REAL)"
+        )
+        conn.commit()
+        self._recover()
+        self.prune()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _update(self, job_id, **fields):
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'], default=str)
+        cols = ', '.join(f"{k} = ?" for k in fields)
+        conn = self._conn()
+        with conn:
+            conn.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def _recover(self):
+        # Tarefas deste host cujo processo morreu (restart/deploy) nunca vão terminar. As do
+        # próprio pid não entram: outro JobRunner deste processo pode estar rodando-as.
+        host = socket.gethostname()
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT id, worker FROM jobs WHERE status IN (?, ?) AND worker LIKE ?", (QUEUED, RUNNING, f"{host}:%")
+        ).fetchall()
+        for row in rows:
+            pid = int(row['worker'].rsplit(':', 1)[1])
+            if not _pid_alive(pid):
+                self._update(row['id'], status=FAILED, error="Interrompida pela reinicialização do servidor", finished=time.time())
+
+    def _process_pool(self):
+        # Criado sob demanda: a maioria dos processos do app nunca roda tarefa pesada de CPU
+        with self._lock:
+            if self._processes is None:
+                # fork copiaria as threads do Streamlit e locks possivelmente travados
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._processes = ProcessPoolExecutor(max_workers=self._process_count,
+                                                      mp_context=multiprocessing.get_context(method))
+            return self._processes
+
+    def prune(self, retention_days=JOB_RETENTION_DAYS):
+        """Apaga as tarefas finalizadas há mais de `retention_days` dias."""
+        conn = self._conn()
+        with conn:
+            cur = conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND finished < ?",
+                (*FINISHED, time.time() - retention_days * 86400)
+            )
+        if self.on_prune:
+            self.on_prune()
+        return cur.rowcount
+
+    def submit(self, name, fn, *args, cpu=False, owner=None, job_id=None, **kwargs):
+        """Enfileira `fn` e retorna o id da tarefa.
+
+        Tarefas de thread recebem um JobContext como primeiro argumento. Com `cpu=True` a
+        função roda num pool de processos (deve ser uma função de módulo, serializável) e
+        não reporta progresso intermediário. `job_id` permite escolher o id antes (ex.: para
+        publicá-lo de forma atômica no backend de estado)."""
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._submitted += 1
+            prune = self._submitted % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO jobs (id, name, owner, worker, status, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, name, owner, WORKER_ID, QUEUED, time.time())
+            )
+        if cpu:
+            self._update(job_id, status=RUNNING, started=time.time())
+            future = self._process_pool().submit(fn, *args, **kwargs)
+            self._futures[job_id] = future
+            future.add_done_callback(lambda f: self._finish(job_id, f))
+        else:
+            ctx = JobContext(self, job_id)
+            self._contexts[job_id] = ctx
+            self._futures[job_id] = self._threads.submit(self._run, job_id, ctx, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, ctx, fn, args, kwargs):
+        try:
+            # Cancelada depois que o future já tinha começado (cancel() não o impediu)
+            ctx.check_cancelled()
+            self._update(job_id, status=RUNNING, started=time.time())
+            result = fn(ctx, *args, **kwargs)
+            self._update(job_id, status=DONE, progress=1.0, result=result, finished=time.time())
+        except JobCancelled:
+            self._update(job_id, status=CANCELLED, finished=time.time())
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=f"{e}\n{traceback.format_exc()}", finished=time.time())
+        finally:
+            self._contexts.pop(job_id, None)
+            self._futures.pop(job_id, None)
+
+    def _finish(self, job_id, future):
+        self._futures.pop(job_id, None)
+        if future.cancelled():
+            self._update(job_id, status=CANCELLED, finished=time.time())
+        elif future.exception() is not None:
+            self._update(job_id, status=FAILED, error=str(future.exception()), finished=time.time())
+        else:
+            self._update(job_id, status=DONE, progress=1.0, result=future.result(), finished=time.time())
+
+    def cancel(self, job_id):
+        """Cancela a tarefa: se ainda estiver na fila não chega a rodar; se estiver rodando
+        numa thread, é interrompida no próximo ctx.progress()/check_cancelled()."""
+        ctx = self._contexts.get(job_id)
+        if ctx:
+            ctx._cancel.set()
+        future = self._futures.get(job_id)
+        if future and future.cancel():
+            self._update(job_id, status=CANCELLED, finished=time.time())
+            return True
+        return ctx is not None
+
+    def status(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def result(self, job_id):
+        job = self.status(job_id)
+        return job['result'] if job and job['status'] == DONE else None
+
+    def list_jobs(self, owner=None, limit=20):
+        sql = "SELECT id, name, owner, status, progress, message, created, finished FROM jobs"
+        params = ()
+        if owner is not None:
+            sql += " WHERE owner = ?"
+            params = (owner,)
+        sql += " ORDER BY created DESC LIMIT ?"
+        return [dict(r) for r in self._conn().execute(sql, (*params, limit)).fetchall()]
+
+    def shutdown(self, wait=False):
+        for ctx in list(self._contexts.values()):
+            ctx._cancel.set()
+        self._threads.shutdown(wait=wait, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=wait, cancel_futures=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
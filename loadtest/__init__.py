@@ -0,0 +1,2 @@
+"""Harness de teste de carga do app Streamlit: sessões headless divididas entre réplicas
+isoladas (ver `python -m loadtest --help` e o comentário em `loadtest/__main__.py`)."""
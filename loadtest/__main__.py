@@ -0,0 +1,100 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from loadtest.worker import run_worker
+
+# O que este teste mede: N sessões abertas ao mesmo tempo, divididas entre W processos
+# independentes (cada um com o próprio "banco" em memória e o próprio backend de estado,
+# ou seja, W réplicas isoladas, não um servidor compartilhado). Dentro de cada processo as
+# sessões são intercaladas, uma rerun por vez, então no máximo W reruns rodam em paralelo.
+# As latências são de reruns sem disputa por lock nem por CPU dentro da réplica; o que
+# cresce com N é o estado mantido por sessão (RSS) e a carga no "banco" por réplica.
+# Não mede concorrência real de N sessões contra um único servidor Streamlit.
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[idx]
+
+
+def run_level(n_sessions, workers, actions, timeout, options):
+    workers = max(1, min(workers, n_sessions))
+    shares = [n_sessions // workers + (1 if i < n_sessions % workers else 0) for i in range(workers)]
+    # spawn: cada worker começa com um runtime do Streamlit limpo, sem herdar threads
+    ctx = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        results = list(pool.map(run_worker, range(workers), shares, [actions] * workers, [timeout] * workers, [options] * workers))
+    wall = time.perf_counter() - start
+
+    latencies = [lat for r in results for lat in r['latencies']]
+    queries = sum(r['queries'] for r in results)
+    # Tempo de execução das sessões (sem a subida dos processos), pelo worker mais lento
+    elapsed = max(r['elapsed'] for r in results)
+    rss_delta = sum(r['rss_after'] - r['rss_before'] for r in results)
+    return {
+        'sessions': n_sessions,
+        'workers': workers,
+        'max_parallel_reruns': workers,
+        'reruns': len(latencies),
+        'errors': sum(r['errors'] for r in results),
+        'elapsed_s': round(elapsed, 2),
+        'wall_s': round(wall, 2),
+        'sessions_per_s': round(n_sessions / elapsed, 2),
+        'reruns_per_s': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'db_queries': queries,
+        'db_queries_per_session': round(queries / n_sessions, 1),
+        'rss_mb_per_worker': round(sum(r['rss_after'] for r in results) / workers, 1),
+        'rss_mb_per_session': round(rss_delta / n_sessions, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m loadtest', description="Teste de carga do app.py com sessões headless, divididas entre "
+                                     "réplicas isoladas (uma rerun por vez em cada réplica).")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[10, 50, 100], help="Quantidades de sessões abertas a testar (intercaladas dentro de cada worker)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Réplicas isoladas; as sessões são divididas entre elas e este é o máximo de reruns em paralelo (padrão: nº de CPUs)")
+    parser.add_argument('--actions', type=int, default=5, help="Ações por sessão após o login")
+    parser.add_argument('--residents', type=int, default=2000)
+    parser.add_argument('--moves', type=int, default=5000)
+    parser.add_argument('--secretaries', type=int, default=5)
+    parser.add_argument('--query-latency-ms', type=float, default=0.0, help="Latência simulada por consulta ao banco")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Timeout de cada rerun (s)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Grava o relatório em JSON neste caminho")
+    args = parser.parse_args(argv)
+
+    options = {
+        'residents': args.residents, 'moves': args.moves, 'secretaries': args.secretaries,
+        'query_latency_ms': args.query_latency_ms, 'seed': args.seed,
+    }
+    results = []
+    for n in args.sessions:
+        result = run_level(n, args.workers, args.actions, args.timeout, options)
+        results.append(result)
+        print(f"{n:>5} sessões abertas em {result['workers']} réplicas (até {result['workers']} reruns em paralelo) | "
+              f"{result['reruns_per_s']:>7} reruns/s | "
+              f"p50 {result['p50_ms']} ms | p95 {result['p95_ms']} ms | p99 {result['p99_ms']} ms | "
+              f"{result['db_queries_per_session']} consultas/sessão | "
+              f"RSS {result['rss_mb_per_worker']} MB/worker ({result['rss_mb_per_session']} MB/sessão) | erros {result['errors']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
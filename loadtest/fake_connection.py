@@ -0,0 +1,222 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from tiering import is_cold
+
+# Substituto em memória do módulo `connection` usado pelo app.py durante os testes de
+# carga: mesmas funções, dados sintéticos e contagem de consultas ao "banco".
+
+_lock = threading.Lock()
+_tables = {'staff': [], 'residents': [], 'moves': []}
+_next_id = Counter()
+_meta = {}
+QUERY_COUNTS = Counter()
+
+# Latência simulada por consulta (segundos), para aproximar um DB remoto
+QUERY_LATENCY = 0.0
+
+FIRST_NAMES = ['João', 'Maria', 'José', 'Ana', 'Antônio', 'Francisca', 'Carlos', 'Paulo', 'Lúcia', 'Pedro', 'Luiz', 'Marcos']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Costa', 'Rodrigues', 'Almeida']
+NEIGHBORHOODS = ['Centro', 'Bairro Novo', 'Jardim América', 'Vila Nova', 'Boa Vista', 'Santa Cruz']
+STATUSES = ['A realizar', 'Realizando', 'Concluído']
+
+
+def _query(name, n=1):
+    with _lock:
+        QUERY_COUNTS[name] += n
+    if QUERY_LATENCY:
+        time.sleep(QUERY_LATENCY * n)
+
+
+def _insert(table, row):
+    with _lock:
+        _next_id[table] += 1
+        row = dict(row, id=_next_id[table])
+        _tables[table].append(row)
+    return row
+
+
+def reset():
+    with _lock:
+        for rows in _tables.values():
+            rows.clear()
+        _next_id.clear()
+        _meta.clear()
+        QUERY_COUNTS.clear()
+
+
+def total_queries():
+    with _lock:
+        return sum(QUERY_COUNTS.values())
+
+
+def seed(secretaries=5, staff_per_secretary=8, residents=2000, moves=5000, rng_seed=42):
+    """Popula o banco em memória com dados sintéticos de tamanho configurável."""
+    rng = random.Random(rng_seed)
+    reset()
+    _insert('staff', {'name': 'Admin Geral', 'email': 'admin@telemim.com', 'password': '123', 'role': 'ADMIN',
+                      'jobTitle': 'Administrador', 'secretaryId': None, 'branchName': None})
+    sec_ids = []
+    for i in range(secretaries):
+        sec = _insert('staff', {'name': f'Secretaria {i + 1}', 'email': f'sec{i + 1}@telemim.com', 'password': '123',
+                                'role': 'SECRETARY', 'jobTitle': 'Secretária', 'secretaryId': None, 'branchName': f'Base {i + 1}'})
+        sec_ids.append(sec['id'])
+        for j in range(staff_per_secretary):
+            role = ['SUPERVISOR', 'DRIVER', 'COORDINATOR', 'HELPER'][j % 4]
+            _insert('staff', {'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {sec["id"]}-{j}',
+                              'email': f'staff{sec["id"]}-{j}@telemim.com', 'password': '123', 'role': role,
+                              'jobTitle': role.title(), 'secretaryId': sec['id'], 'branchName': None})
+
+    staff_by_sec = {}
+    for s in _tables['staff']:
+        staff_by_sec.setdefault((s['secretaryId'], s['role']), []).append(s['id'])
+
+    resident_rows = []
+    for i in range(residents):
+        sec_id = rng.choice(sec_ids)
+        resident_rows.append(_insert('residents', {
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}', 'selo': f'{chr(65 + i % 26)}{i}',
+            'contact': f'119{rng.randint(10000000, 99999999)}', 'originAddress': f'Rua {i}, {rng.randint(1, 999)}',
+            'originNumber': str(rng.randint(1, 999)), 'originNeighborhood': rng.choice(NEIGHBORHOODS),
+            'destAddress': f'Avenida {i}, {rng.randint(1, 999)}', 'destNumber': str(rng.randint(1, 999)),
+            'destNeighborhood': rng.choice(NEIGHBORHOODS), 'observation': '', 'moveDate': None, 'moveTime': None,
+            'secretaryId': sec_id,
+        }))
+
+    today = date.today()
+    for _ in range(moves):
+        res = rng.choice(resident_rows)
+        sec_id = res['secretaryId']
+        status = rng.choice(STATUSES)
+        move_date = today - timedelta(days=rng.randint(-30, 720))
+        _insert('moves', {
+            'residentId': res['id'], 'date': str(move_date), 'time': '08:00', 'metragem': round(rng.uniform(5, 60), 1),
+            'supervisorId': rng.choice(staff_by_sec.get((sec_id, 'SUPERVISOR'), [None])),
+            'coordinatorId': None, 'driverId': rng.choice(staff_by_sec.get((sec_id, 'DRIVER'), [None])),
+            'status': status, 'secretaryId': sec_id,
+            'completionDate': str(move_date) if status == 'Concluído' else None,
+            'completionTime': '17:00' if status == 'Concluído' else None, 'archived': False,
+        })
+
+
+# --- API compatível com connection.py ---
+
+def get_connection():
+    _query('connect')
+    return True
+
+
+def init_db_structure(conn):
+    _query('ddl')
+
+
+def get_schema_version(conn):
+    _query('select')
+    return _meta.get('schema_version')
+
+
+def set_schema_version(conn, version):
+    _query('update')
+    _meta['schema_version'] = version
+    return True
+
+
+def fetch_all_data():
+    _query('select', 3)
+    with _lock:
+        return {table: [dict(r) for r in rows] for table, rows in _tables.items()}
+
+
+def fetch_hot_data():
+    """Como fetch_all_data, mas sem as OS marcadas como arquivadas."""
+    _query('select', 3)
+    with _lock:
+        data = {table: [dict(r) for r in rows] for table, rows in _tables.items() if table != 'moves'}
+        data['moves'] = [dict(m) for m in _tables['moves'] if not m.get('archived')]
+    return data
+
+
+def fetch_moves_to_archive(before_date):
+    _query('select')
+    cutoff = date.fromisoformat(before_date)
+    with _lock:
+        return [dict(m) for m in _tables['moves'] if not m.get('archived') and is_cold(m, cutoff)]
+
+
+def mark_moves_archived(move_ids):
+    _query('update')
+    ids = {str(i) for i in move_ids}
+    with _lock:
+        for m in _tables['moves']:
+            if str(m['id']) in ids:
+                m['archived'] = True
+    return True
+
+
+def authenticate(email, password):
+    _query('select')
+    with _lock:
+        user = next((s for s in _tables['staff'] if s['email'].lower() == email.lower() and s['password'] == password), None)
+    return dict(user) if user else None
+
+
+def insert_staff(name, email, password, role, jobTitle, secretaryId=None, branchName=None):
+    _query('insert')
+    _insert('staff', {'name': name, 'email': email, 'password': password, 'role': role, 'jobTitle': jobTitle,
+                      'secretaryId': secretaryId, 'branchName': branchName})
+    return True
+
+
+def insert_resident(resident):
+    _query('insert')
+    _insert('residents', resident)
+    return True
+
+
+def insert_move(move):
+    _query('insert')
+    _insert('moves', dict({'completionDate': None, 'completionTime': None, 'archived': False}, **move))
+    return True
+
+
+def update_move_details(move_id, metragem, status, completionDate=None, completionTime=None):
+    _query('update')
+    with _lock:
+        for m in _tables['moves']:
+            if str(m['id']) == str(move_id):
+                m.update(metragem=metragem, status=status, completionDate=completionDate, completionTime=completionTime)
+                # Reabrir uma OS arquivada a traz de volta para o hot tier
+                if status != 'Concluído':
+                    m['archived'] = False
+                return True
+    return False
+
+
+def merge_residents(survivor_id, duplicate_ids):
+    _query('update')
+    dup = {str(d) for d in duplicate_ids if str(d) != str(survivor_id)}
+    with _lock:
+        for m in _tables['moves']:
+            if str(m['residentId']) in dup:
+                m['residentId'] = survivor_id
+        _tables['residents'] = [r for r in _tables['residents'] if str(r['id']) not in dup]
+    return True
+
+
+def update_staff_details(staff_id, name, jobTitle, email, role):
+    _query('update')
+    with _lock:
+        for s in _tables['staff']:
+            if str(s['id']) == str(staff_id):
+                s.update(name=name, jobTitle=jobTitle, email=email, role=role)
+                return True
+    return False
+
+
+def random_move_id(rng, secretary_id=None):
+    with _lock:
+        moves = [m for m in _tables['moves'] if not m.get('archived') and (secretary_id is None or m['secretaryId'] == secretary_id)]
+    return rng.choice(moves)['id'] if moves else None
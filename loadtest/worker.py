@@ -0,0 +1,130 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+# Cada worker é um processo próprio fazendo o papel de uma réplica do servidor: o AppTest
+# altera estado global de runtime/config a cada run e não pode ser usado de várias threads.
+# Nenhum módulo do app (nem o fake_connection, que importa o tiering) é importado no topo
+# deste arquivo: as configurações são lidas no import, depois que run_worker define o ambiente.
+
+
+def rss_mb():
+    """Memória residente atual do processo (o "servidor", já que o AppTest roda o script em processo)."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Session:
+    """Roteiro de um despachante: login, filtros no dashboard, agendamento e edição de OS."""
+
+    def __init__(self, db, rng, email, secretary_id, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.db = db
+        self.rng = rng
+        self.email = email
+        self.secretary_id = secretary_id
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        self.latencies = []
+        self.errors = 0
+
+    def _run(self, element=None):
+        start = time.perf_counter()
+        (element or self.at).run()
+        self.latencies.append(time.perf_counter() - start)
+        if self.at.exception:
+            self.errors += 1
+
+    def _widget(self, kind, label):
+        return next(w for w in getattr(self.at, kind) if w.label == label)
+
+    def login(self):
+        self._run()
+        self._widget('text_input', 'Email').input(self.email)
+        self._widget('text_input', 'Senha').input('123')
+        self._run(self._widget('button', 'Entrar').click())
+
+    def filter_dashboard(self):
+        self._run(self.at.selectbox(key='status_selectbox').set_value(self.rng.choice(['A realizar', 'Realizando', 'Concluído'])))
+        self._run(self._widget('text_input', 'Nome do Cliente').input(self.rng.choice(self.db.FIRST_NAMES)))
+
+    def schedule(self):
+        self._run(self._widget('button', 'Confirmar Agendamento').click())
+
+    def edit_move(self):
+        # O AppTest não interage com st.data_editor; a edição entra pelo session state e o
+        # manage_moves a salva pelo mesmo caminho da tabela (update_move_details + load_data)
+        move_id = self.db.random_move_id(self.rng, self.secretary_id)
+        if move_id is not None:
+            self.at.session_state['pending_move_edits'] = {
+                move_id: {'status': 'Realizando', 'metragem': round(self.rng.uniform(5, 60), 1)}
+            }
+        self._run()
+
+    def step(self):
+        roll = self.rng.random()
+        if roll < 0.6:
+            self.filter_dashboard()
+        elif roll < 0.8:
+            self.schedule()
+        else:
+            self.edit_move()
+
+
+def run_worker(worker_id, n_sessions, actions, timeout, options):
+    """Executa `n_sessions` sessões intercaladas (todas abertas ao mesmo tempo neste
+    "servidor") e devolve as medições brutas para o processo principal agregar."""
+    # Cada worker tem o próprio "banco", então arquivo, snapshot e estado também são dele
+    if 'tiering' in sys.modules:
+        raise RuntimeError("módulos do app importados antes de configurar o ambiente do worker")
+    os.environ['TELEMIM_ARCHIVE_DIR'] = tempfile.mkdtemp(prefix='telemim-archive-')
+    os.environ['TELEMIM_SNAPSHOT_DIR'] = tempfile.mkdtemp(prefix='telemim-snapshot-')
+    os.environ['TELEMIM_STATE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='telemim-state-'), 'state.db')
+
+    from loadtest import fake_connection
+    # O app importa `connection`; o substituto em memória assume esse nome
+    sys.modules['connection'] = fake_connection
+    fake_connection.QUERY_LATENCY = options['query_latency_ms'] / 1000
+    fake_connection.seed(options['secretaries'], residents=options['residents'], moves=options['moves'], rng_seed=options['seed'])
+
+    users = ['admin@telemim.com'] + [f'sec{i + 1}@telemim.com' for i in range(options['secretaries'])]
+    sec_ids = {s['email']: s['id'] for s in fake_connection.fetch_all_data()['staff'] if s['role'] == 'SECRETARY'}
+    queries_before = fake_connection.total_queries()
+    rss_before = rss_mb()
+
+    sessions = []
+    for i in range(n_sessions):
+        rng = random.Random(options['seed'] + worker_id * 100003 + i)
+        email = rng.choice(users)
+        sessions.append(Session(fake_connection, rng, email, sec_ids.get(email), timeout))
+
+    start = time.perf_counter()
+    for round_ in range(actions + 1):
+        for i, session in enumerate(sessions):
+            try:
+                session.login() if round_ == 0 else session.step()
+            except Exception as e:
+                session.errors += 1
+                print(f"[loadtest] worker {worker_id}, sessão {i} falhou: {e}", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'sessions': n_sessions,
+        'latencies': [lat for s in sessions for lat in s.latencies],
+        'errors': sum(s.errors for s in sessions),
+        'elapsed': elapsed,
+        'queries': fake_connection.total_queries() - queries_before,
+        # As sessões (AppTest) continuam vivas aqui, então o RSS inclui o estado de todas elas
+        'rss_before': rss_before,
+        'rss_after': rss_mb(),
+    }
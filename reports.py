@@ -0,0 +1,21 @@
+from collections import defaultdict
+
+# Consolidações usadas na página de Relatórios. Ficam num módulo próprio (e não no
+# app.py) para poderem ser enviadas ao pool de processos do executor de tarefas.
+
+
+def summarize_moves(moves, staff):
+    """Totais de OS e volume por secretaria e status."""
+    sec_names = {str(s['id']): s.get('branchName') or s['name'] for s in staff}
+    totals = defaultdict(lambda: {'os': 0, 'volume': 0.0})
+    for m in moves:
+        key = (sec_names.get(str(m.get('secretaryId')), 'N/A'), m.get('status') or 'N/A')
+        totals[key]['os'] += 1
+        try:
+            totals[key]['volume'] += float(m.get('metragem') or 0)
+        except (TypeError, ValueError):
+            pass
+    return [
+        {'Secretaria': sec, 'Status': status, 'OS': t['os'], 'Volume (m³)': round(t['volume'], 2)}
+        for (sec, status), t in sorted(totals.items())
+    ]
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+from startup import timer
+from state_backend import dumps, loads
+
+# --- SNAPSHOT LOCAL DOS DADOS (WARM START) ---
+# Após cada carga do banco, as tabelas do hot tier são gravadas em arquivos Arrow IPC
+# sem compressão, que podem ser lidos via memory-map. Um processo recém-iniciado usa o
+# snapshot no lugar do fetch_all_data() se a versão gravada bater com o marcador de
+# alterações do backend de estado (incrementado a cada escrita feita pelo app).
+
+SNAPSHOT_DIR = os.environ.get('TELEMIM_SNAPSHOT_DIR', 'snapshot')
+# Limite de idade para cobrir alterações feitas fora do app (direto no banco)
+SNAPSHOT_MAX_AGE = int(os.environ.get('TELEMIM_SNAPSHOT_MAX_AGE', '3600'))
+SNAPSHOT_TABLES = ('staff', 'residents', 'moves')
+
+
+def _manifest_path(directory):
+    return os.path.join(directory, 'manifest.json')
+
+
+def _read_manifest(directory):
+    try:
+        with open(_manifest_path(directory)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _locked(directory):
+    # Serializa a troca do manifesto entre jobs de snapshot e réplicas na mesma máquina
+    with open(os.path.join(directory, 'snapshot.lock'), 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _version_of(name):
+    try:
+        return int(name[1:].split('-', 1)[0])
+    except ValueError:
+        return None
+
+
+_PLAIN = (int, float, str, bool)
+
+
+def _encode_rows(rows):
+    """Colunas com datas, horas ou decimais (às vezes misturados com texto) não viram Arrow
+    diretamente; elas são gravadas com o codec do backend de estado, que preserva os tipos.
+    Retorna (linhas, colunas codificadas)."""
+    encoded = sorted({k for r in rows for k, v in r.items() if v is not None and not isinstance(v, _PLAIN)})
+    if not encoded:
+        return rows, []
+    rows = [{k: dumps(v) if k in encoded and v is not None else v for k, v in r.items()} for r in rows]
+    return rows, encoded
+
+
+def _decode_rows(rows, encoded):
+    if not encoded:
+        return rows
+    return [{k: loads(v) if k in encoded and v is not None else v for k, v in r.items()} for r in rows]
+
+
+def save_snapshot(data, version, directory=SNAPSHOT_DIR):
+    """Grava o snapshot; retorna False (sem erro) se o pyarrow não estiver disponível ou se
+    outro escritor já publicou esta versão ou uma mais nova.
+
+    Cada gravação vai para um diretório próprio (v<versão>-<uuid>) e só passa a valer com
+    a troca atômica do manifesto, então tabelas de versões diferentes nunca se misturam."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return False
+    os.makedirs(directory, exist_ok=True)
+    name = f"v{version}-{uuid.uuid4().hex}"
+    target = os.path.join(directory, name)
+    os.makedirs(target)
+    try:
+        encoded = {}
+        for table in SNAPSHOT_TABLES:
+            rows, encoded[table] = _encode_rows(data.get(table) or [])
+            with pa.OSFile(os.path.join(target, f'{table}.arrow'), 'wb') as sink:
+                arrow_table = pa.Table.from_pylist(rows)
+                with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                    writer.write_table(arrow_table)
+        with _locked(directory):
+            current = _read_manifest(directory)
+            # Outro escritor já publicou esta versão (ou uma mais nova)
+            if current and current.get('version', -1) >= version:
+                shutil.rmtree(target, ignore_errors=True)
+                return False
+            tmp = f"{_manifest_path(directory)}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump({'version': version, 'created': time.time(), 'path': name, 'tables': list(SNAPSHOT_TABLES),
+                           'encoded': encoded}, f)
+            os.replace(tmp, _manifest_path(directory))
+            # Versões anteriores não serão mais lidas; as mais novas podem estar sendo gravadas
+            for entry in os.listdir(directory):
+                old = _version_of(entry) if entry.startswith('v') else None
+                if old is not None and old < version:
+                    shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(target, ignore_errors=True)
+        raise
+    return True
+
+
+def load_snapshot(version, directory=SNAPSHOT_DIR, max_age=SNAPSHOT_MAX_AGE):
+    """Retorna os dados do snapshot, ou None se ele não existir, estiver velho ou não
+    corresponder à versão atual dos dados."""
+    manifest = _read_manifest(directory)
+    # Manifestos de formatos anteriores (tabelas na raiz, datas gravadas como texto) são ignorados
+    if manifest is None or 'encoded' not in manifest:
+        return None
+    if manifest.get('version') != version or time.time() - manifest.get('created', 0) > max_age:
+        return None
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    data = {}
+    try:
+        with timer.stage("Leitura do snapshot"):
+            for table in manifest['tables']:
+                with pa.memory_map(os.path.join(directory, manifest['path'], f'{table}.arrow'), 'r') as source:
+                    rows = pa.ipc.open_file(source).read_all().to_pylist()
+                data[table] = _decode_rows(rows, manifest['encoded'].get(table))
+    except OSError:
+        # Diretório removido por um escritor mais novo entre a leitura do manifesto e a das tabelas
+        return None
+    return data
@@ -0,0 +1,62 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# --- MEDIÇÃO DA INICIALIZAÇÃO DO PROCESSO ---
+# O módulo é importado uma única vez por processo, então `timer` guarda as etapas da
+# inicialização sem precisar de estado no Streamlit. Só a primeira ocorrência de cada
+# etapa é registrada: as recargas seguintes (cache expirado, etc.) não são cold start.
+
+
+class StartupTimer:
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        with self._lock:
+            if any(s['Etapa'] == name for s in self.stages):
+                return
+            self.stages.append({'Etapa': name, 'ms': round(seconds * 1000, 1), 'Após início (s)': round(time.time() - self.started, 2)})
+        logger.info("%s: %.1f ms", name, seconds * 1000)
+
+    def report(self):
+        with self._lock:
+            return list(self.stages)
+
+
+timer = StartupTimer()
+
+
+class LazyModule:
+    """Adia a importação de um módulo pesado até o primeiro acesso a um atributo."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            with timer.stage(f"import {self._name}"):
+                self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_import(name):
+    # Se alguém já importou o módulo, não há o que adiar
+    return sys.modules.get(name) or LazyModule(name)
@@ -0,0 +1,225 @@
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+# --- CONFIGURAÇÃO DO BACKEND DE ESTADO ---
+# 'memory': estado compartilhado apenas entre as sessões do mesmo processo.
+# 'sqlite': estado em arquivo local, compartilhado entre réplicas do app (mesma máquina
+#           ou volume compartilhado), permitindo balanceamento sem sticky sessions.
+STATE_BACKEND = os.environ.get('TELEMIM_STATE_BACKEND', 'memory')
+STATE_PATH = os.environ.get('TELEMIM_STATE_PATH', 'telemim_state.db')
+
+
+# Codec JSON que preserva os tipos entregues pelo DB (datas, horas, decimais), para que
+# uma sessão servida pelo cache veja os mesmos tipos que uma servida por fetch_all_data()
+_ENCODERS = (
+    (datetime, 'datetime', lambda v: v.isoformat(), datetime.fromisoformat),
+    (date, 'date', lambda v: v.isoformat(), date.fromisoformat),
+    (dt_time, 'time', lambda v: v.isoformat(), dt_time.fromisoformat),
+    (timedelta, 'timedelta', lambda v: v.total_seconds(), lambda v: timedelta(seconds=v)),
+    (Decimal, 'decimal', str, Decimal),
+)
+_DECODERS = {name: decode for _, name, _, decode in _ENCODERS}
+
+
+def _encode(value):
+    for cls, name, encode, _ in _ENCODERS:
+        if isinstance(value, cls):
+            return {'__type__': name, 'value': encode(value)}
+    raise TypeError(f"Tipo não suportado pelo backend de estado: {type(value).__name__}")
+
+
+def _decode(obj):
+    if len(obj) == 2 and obj.get('__type__') in _DECODERS and 'value' in obj:
+        return _DECODERS[obj['__type__']](obj['value'])
+    return obj
+
+
+def dumps(value):
+    return json.dumps(value, default=_encode)
+
+
+def loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+class StateBackend:
+    """Armazenamento chave/valor separado por namespace ('sessions', 'cache', 'roles'...).
+    Valores devem ser serializáveis em JSON (mais datas, horas e decimais); `ttl` em segundos.
+    `persistent` indica se o conteúdo sobrevive ao reinício do processo."""
+
+    persistent = False
+
+    def get(self, namespace, key, default=None):
+        raise NotImplementedError
+
+    def set(self, namespace, key, value, ttl=None):
+        raise NotImplementedError
+
+    def add(self, namespace, key, value, ttl=None):
+        """Grava só se a chave não existir (ou tiver expirado); retorna se gravou. Atômico,
+        serve para uma única sessão/réplica "ganhar" uma tarefa."""
+        raise NotImplementedError
+
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    def items(self, namespace):
+        raise NotImplementedError
+
+    def incr(self, namespace, key, amount=1):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Remove as entradas com TTL vencido (sessões, cache), que as leituras já ignoram."""
+        raise NotImplementedError
+
+
+class InMemoryBackend(StateBackend):
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, entry):
+        return entry[1] is None or entry[1] > time.time()
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None or not self._alive(entry):
+                return default
+            # Cópia para que a sessão não altere o valor compartilhado por referência
+            return copy.deepcopy(entry[0])
+
+    def set(self, namespace, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[(namespace, key)] = (copy.deepcopy(value), expires)
+
+    def add(self, namespace, key, value, ttl=None):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is not None and self._alive(entry):
+                return False
+            self._data[(namespace, key)] = (copy.deepcopy(value), time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._data.pop((namespace, key), None)
+
+    def items(self, namespace):
+        with self._lock:
+            return {k: copy.deepcopy(e[0]) for (ns, k), e in self._data.items() if ns == namespace and self._alive(e)}
+
+    def incr(self, namespace, key, amount=1):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            value = (entry[0] if entry and self._alive(entry) else 0) + amount
+            self._data[(namespace, key)] = (value, None)
+            return value
+
+    def purge_expired(self):
+        with self._lock:
+            for k in [k for k, e in self._data.items() if not self._alive(e)]:
+                del self._data[k]
+
+
+class SQLiteBackend(StateBackend):
+
+    persistent = True
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires REAL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        conn.commit()
+
+    def _conn(self):
+        # sqlite3 não compartilha conexões entre threads; uma por thread do Streamlit
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ? AND (expires IS NULL OR expires > ?)",
+            (namespace, str(key), time.time())
+        ).fetchone()
+        return loads(row[0]) if row else default
+
+    def set(self, namespace, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (namespace, str(key), dumps(value), expires)
+            )
+
+    def add(self, namespace, key, value, ttl=None):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ? AND expires IS NOT NULL AND expires <= ?",
+                         (namespace, str(key), now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO kv (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (namespace, str(key), dumps(value), now + ttl if ttl else None)
+            )
+        return cur.rowcount == 1
+
+    def delete(self, namespace, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, str(key)))
+
+    def items(self, namespace):
+        rows = self._conn().execute(
+            "SELECT key, value FROM kv WHERE namespace = ? AND (expires IS NULL OR expires > ?)",
+            (namespace, time.time())
+        ).fetchall()
+        return {k: loads(v) for k, v in rows}
+
+    def incr(self, namespace, key, amount=1):
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE garante o incremento atômico entre processos
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, str(key))).fetchone()
+            value = (loads(row[0]) if row else 0) + amount
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (namespace, key, value, expires) VALUES (?, ?, ?, NULL)",
+                (namespace, str(key), dumps(value))
+            )
+        return value
+
+    def purge_expired(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+
+
+def get_backend(kind=None, path=None):
+    kind = kind or STATE_BACKEND
+    if kind == 'sqlite':
+        return SQLiteBackend(path or STATE_PATH)
+    if kind == 'memory':
+        return InMemoryBackend()
+    raise ValueError(f"Backend de estado desconhecido: {kind}")
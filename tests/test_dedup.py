@@ -0,0 +1,63 @@
+from dedup import ResidentIndex, normalize_phone, similarity, split_batch, _features
+
+
+def resident(id, name, contact='', secretaryId=1, **extra):
+    return dict(id=id, name=name, contact=contact, secretaryId=secretaryId, **extra)
+
+
+def test_normalize_phone_ignores_country_code_and_ninth_digit():
+    assert normalize_phone('+55 (11) 99999-1234') == normalize_phone('9999-1234')
+    assert normalize_phone('123') == ''
+
+
+def test_household_members_sharing_phone_are_not_duplicates():
+    joao = resident(1, 'João Silva', '11 99999-1111', originNeighborhood='Centro')
+    maria = resident(2, 'Maria da Silva', '11 99999-1111', originNeighborhood='Centro')
+    assert similarity(_features(joao), _features(maria)) == 0.0
+    assert ResidentIndex([joao, maria]).duplicate_groups() == []
+
+
+def test_household_does_not_merge_into_group():
+    residents = [
+        resident(1, 'Maria da Silva', '11 99999-1111', originNeighborhood='Centro'),
+        resident(2, 'Maria Silva', '11 99999-1111', originNeighborhood='Centro'),
+        resident(3, 'João Silva', '11 99999-1111', originNeighborhood='Centro'),
+    ]
+    groups = ResidentIndex(residents).duplicate_groups()
+    assert [[r['id'] for r in g] for g in groups] == [[1, 2]]
+
+
+def test_groups_do_not_chain_through_phoneless_record():
+    residents = [
+        resident(1, 'Maria Silva', '11 99999-1111'),
+        resident(2, 'Maria Silva'),
+        resident(3, 'Maria Silva', '21 98888-2222'),
+    ]
+    groups = ResidentIndex(residents).duplicate_groups()
+    assert [[r['id'] for r in g] for g in groups] == [[1, 2]]
+
+
+def test_groups_stay_within_secretary():
+    residents = [
+        resident(1, 'Maria Silva', '11 99999-1111', secretaryId=1),
+        resident(2, 'Maria Silva', '11 99999-1111', secretaryId=2),
+    ]
+    assert ResidentIndex(residents).duplicate_groups() == []
+
+
+def test_survivor_is_oldest_record():
+    residents = [resident(10, 'Ana Souza', '1188887777'), resident(9, 'Ana Souza', '1188887777')]
+    groups = ResidentIndex(residents).duplicate_groups()
+    assert [r['id'] for r in groups[0]] == [9, 10]
+
+
+def test_split_batch_catches_duplicates_inside_the_file():
+    index = ResidentIndex([resident(1, 'Carlos Lima', '1177776666')])
+    rows = [
+        {'name': 'Carlos Lima', 'contact': '(11) 7777-6666'},
+        {'name': 'Paulo Costa', 'contact': '1155554444'},
+        {'name': 'Paulo Costa', 'contact': '1155554444'},
+    ]
+    unique, duplicates = split_batch(rows, index)
+    assert [r['name'] for r in unique] == ['Paulo Costa']
+    assert len(duplicates) == 2
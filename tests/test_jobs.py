@@ -0,0 +1,114 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from jobs import CANCELLED, DONE, FAILED, FINISHED, QUEUED, RUNNING, JobContext, JobRunner
+from reports import summarize_moves
+
+
+@pytest.fixture
+def runner(tmp_path):
+    runner = JobRunner(str(tmp_path / 'jobs.db'), threads=1, processes=1)
+    yield runner
+    runner.shutdown(wait=True)
+
+
+def wait(runner, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = runner.status(job_id)
+        if job['status'] in FINISHED:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"tarefa {job_id} não terminou")
+
+
+def test_done_and_failed(runner):
+    ok = runner.submit("ok", lambda ctx, x: x * 2, 21)
+    bad = runner.submit("bad", lambda ctx: 1 / 0)
+    assert wait(runner, ok)['status'] == DONE
+    assert runner.result(ok) == 42
+    job = wait(runner, bad)
+    assert job['status'] == FAILED and 'ZeroDivisionError' in job['error']
+    assert runner.result(bad) is None
+
+
+def test_cancel_queued_job_never_runs(runner):
+    release = threading.Event()
+    ran = []
+    blocker = runner.submit("blocker", lambda ctx: release.wait(5))
+    queued = runner.submit("queued", lambda ctx: ran.append(1))
+    assert runner.cancel(queued)
+    release.set()
+    wait(runner, blocker)
+    assert wait(runner, queued)['status'] == CANCELLED
+    assert ran == []
+
+
+def test_cancel_running_job_stops_at_next_progress(runner):
+    started = threading.Event()
+
+    def work(ctx):
+        started.set()
+        while True:
+            ctx.progress(0.5, "trabalhando")
+            time.sleep(0.01)
+
+    job_id = runner.submit("loop", work)
+    assert started.wait(5)
+    assert runner.cancel(job_id)
+    assert wait(runner, job_id)['status'] == CANCELLED
+
+
+def test_cancel_after_future_started_is_recorded(runner):
+    job_id = runner.submit("noop", lambda ctx: None)
+    wait(runner, job_id)
+    # Simula o cancelamento que chega depois que o future começou, antes da tarefa rodar
+    runner._update(job_id, status=QUEUED, finished=None)
+    ctx = JobContext(runner, job_id)
+    ctx._cancel.set()
+    runner._run(job_id, ctx, lambda ctx: None, (), {})
+    assert runner.status(job_id)['status'] == CANCELLED
+
+
+def test_cpu_job_runs_in_process_pool(runner):
+    moves = [{'secretaryId': 1, 'status': 'Concluído', 'metragem': '2.5'}]
+    job_id = runner.submit("consolidado", summarize_moves, moves, [{'id': 1, 'name': 'Ana'}], cpu=True)
+    job = wait(runner, job_id, timeout=60)
+    assert job['status'] == DONE
+    assert job['result'] == [{'Secretaria': 'Ana', 'Status': 'Concluído', 'OS': 1, 'Volume (m³)': 2.5}]
+
+
+def _insert(runner, job_id, status, worker, finished=None):
+    conn = runner._conn()
+    with conn:
+        conn.execute("INSERT INTO jobs (id, name, worker, status, created, finished) VALUES (?, ?, ?, ?, ?, ?)",
+                     (job_id, job_id, worker, status, time.time(), finished))
+
+
+def test_recover_only_fails_jobs_of_dead_processes(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    first = JobRunner(path, threads=1)
+    host = socket.gethostname()
+    _insert(first, 'mine', RUNNING, f"{host}:{os.getpid()}")
+    _insert(first, 'dead', RUNNING, f"{host}:999999999")
+    second = JobRunner(path, threads=1)
+    assert second.status('mine')['status'] == RUNNING
+    assert second.status('dead')['status'] == FAILED
+    first.shutdown()
+    second.shutdown()
+
+
+def test_prune_removes_old_finished_jobs_and_calls_hook(runner):
+    calls = []
+    runner.on_prune = lambda: calls.append(1)
+    _insert(runner, 'old', DONE, 'x:1', finished=time.time() - 30 * 86400)
+    _insert(runner, 'recent', DONE, 'x:1', finished=time.time())
+    _insert(runner, 'old-running', RUNNING, 'x:1', finished=None)
+    assert runner.prune(retention_days=7) == 1
+    assert runner.status('old') is None
+    assert runner.status('recent') is not None and runner.status('old-running') is not None
+    assert calls == [1]
@@ -0,0 +1,49 @@
+import os
+from datetime import date, time
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from snapshot import load_snapshot, save_snapshot
+
+
+def sample(metragem='15.00'):
+    return {
+        'staff': [{'id': 1, 'name': 'Admin'}],
+        'residents': [{'id': 1, 'name': 'João', 'moveDate': date(2024, 1, 2)}],
+        'moves': [
+            {'id': 1, 'date': date(2024, 1, 2), 'time': time(8, 0), 'metragem': Decimal(metragem)},
+            {'id': 2, 'date': '2024-01-03', 'time': None, 'metragem': None},
+        ],
+    }
+
+
+def test_round_trip_keeps_types(tmp_path):
+    assert save_snapshot(sample(), 3, str(tmp_path))
+    data = load_snapshot(3, str(tmp_path))
+    assert data['moves'][0] == {'id': 1, 'date': date(2024, 1, 2), 'time': time(8, 0), 'metragem': Decimal('15.00')}
+    assert data['moves'][1]['date'] == '2024-01-03'
+    assert data['residents'][0]['moveDate'] == date(2024, 1, 2)
+
+
+def test_other_version_is_rejected(tmp_path):
+    save_snapshot(sample(), 3, str(tmp_path))
+    assert load_snapshot(4, str(tmp_path)) is None
+    assert load_snapshot(3, str(tmp_path), max_age=-1) is None
+
+
+def test_older_writer_does_not_replace_newer_version(tmp_path):
+    assert save_snapshot(sample('20'), 5, str(tmp_path))
+    assert not save_snapshot(sample('10'), 4, str(tmp_path))
+    assert load_snapshot(5, str(tmp_path))['moves'][0]['metragem'] == Decimal('20')
+    assert [e for e in os.listdir(tmp_path) if e.startswith('v')] == [e for e in os.listdir(tmp_path) if e.startswith('v5-')]
+
+
+def test_newer_version_removes_older_directories(tmp_path):
+    save_snapshot(sample(), 1, str(tmp_path))
+    save_snapshot(sample(), 2, str(tmp_path))
+    versions = [e.split('-')[0] for e in os.listdir(tmp_path) if e.startswith('v')]
+    assert versions == ['v2']
+    assert load_snapshot(1, str(tmp_path)) is None
@@ -0,0 +1,78 @@
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import pytest
+
+from state_backend import InMemoryBackend, SQLiteBackend, dumps, loads
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return InMemoryBackend()
+    return SQLiteBackend(str(tmp_path / 'state.db'))
+
+
+def test_codec_round_trip_keeps_types():
+    value = {
+        'date': date(2024, 1, 2), 'datetime': datetime(2024, 1, 2, 8, 30), 'time': time(8, 0),
+        'delta': timedelta(minutes=90), 'metragem': Decimal('15.00'), 'rows': [{'id': 1, 'name': 'João'}],
+    }
+    assert loads(dumps(value)) == value
+    assert isinstance(loads(dumps(Decimal('1.5'))), Decimal)
+
+
+def test_codec_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+
+def test_set_get_delete(backend):
+    backend.set('cache', 'data', {'metragem': Decimal('2.50'), 'date': date(2024, 5, 1)})
+    assert backend.get('cache', 'data') == {'metragem': Decimal('2.50'), 'date': date(2024, 5, 1)}
+    backend.delete('cache', 'data')
+    assert backend.get('cache', 'data', 'missing') == 'missing'
+
+
+def test_expired_entries_are_hidden_and_purged(backend):
+    backend.set('sessions', 'old', {'userId': 1}, ttl=-1)
+    backend.set('sessions', 'new', {'userId': 2}, ttl=60)
+    assert backend.get('sessions', 'old') is None
+    assert list(backend.items('sessions')) == ['new']
+    backend.purge_expired()
+    assert backend.add('sessions', 'old', {'userId': 3})
+
+
+def test_incr_starts_at_zero_and_reads_with_zero_amount(backend):
+    assert backend.incr('meta', 'data_version', 0) == 0
+    assert backend.incr('meta', 'data_version') == 1
+    assert backend.incr('meta', 'data_version', 0) == 1
+
+
+def test_incr_is_atomic_across_threads(backend):
+    def bump():
+        for _ in range(50):
+            backend.incr('meta', 'counter')
+
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert backend.get('meta', 'counter') == 200
+
+
+def test_add_only_writes_once(backend):
+    assert backend.add('jobs', 'claim', 'a')
+    assert not backend.add('jobs', 'claim', 'b')
+    assert backend.get('jobs', 'claim') == 'a'
+    backend.add('jobs', 'expired', 'x', ttl=-1)
+    assert backend.add('jobs', 'expired', 'y')
+
+
+def test_values_are_copies(backend):
+    backend.set('roles', '1', {'name': 'Ajudante'})
+    role = backend.get('roles', '1')
+    role['name'] = 'Outro'
+    assert backend.get('roles', '1') == {'name': 'Ajudante'}
@@ -0,0 +1,230 @@
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos, apenas entre threads
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAÇÕES DE ARQUIVAMENTO ---
+# OS concluídas há mais de ARCHIVE_AFTER_DAYS dias são marcadas como arquivadas no DB
+# (fetch_hot_data deixa de trazê-las) e copiadas para um arquivo compactado em disco,
+# que só é lido pela busca do dashboard e pelos Relatórios quando solicitado.
+ARCHIVE_AFTER_DAYS = int(os.environ.get('TELEMIM_ARCHIVE_AFTER_DAYS', '90'))
+# O flag `archived` é global no DB, mas o arquivo é um diretório: com réplicas em mais de
+# um nó, ARCHIVE_DIR precisa ser o mesmo diretório compartilhado (volume de rede, como o
+# STATE_PATH do backend sqlite). O app confere isso com MoveArchive.archive_id().
+ARCHIVE_DIR = os.environ.get('TELEMIM_ARCHIVE_DIR', 'archive')
+ARCHIVE_STATUS = 'Concluído'
+
+# Colunas de id anuláveis voltam do Parquet como float (2.0) se não forem tipadas
+ID_COLUMNS = ('id', 'residentId', 'supervisorId', 'coordinatorId', 'driverId', 'secretaryId')
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def archive_cutoff(today=None, max_age_days=None):
+    """Data limite: OS concluídas antes dela vão para o arquivo."""
+    max_age_days = ARCHIVE_AFTER_DAYS if max_age_days is None else max_age_days
+    return (today or date.today()) - timedelta(days=max_age_days)
+
+
+def is_cold(move, cutoff):
+    """Uma OS é "fria" quando está concluída e a data de conclusão (ou, na falta dela,
+    a data agendada) é anterior ao limite."""
+    if move.get('status') != ARCHIVE_STATUS:
+        return False
+    ref = _parse_date(move.get('completionDate')) or _parse_date(move.get('date'))
+    return ref is not None and ref < cutoff
+
+
+class MoveArchive:
+    """Armazena as OS arquivadas em um único arquivo Parquet compactado (zstd).
+    Se o pyarrow não estiver instalado, usa um pickle compactado com gzip."""
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        try:
+            import pyarrow  # noqa: F401
+            return os.path.join(self.directory, 'moves.parquet')
+        except ImportError:
+            return os.path.join(self.directory, 'moves.pkl.gz')
+
+    @contextmanager
+    def _locked(self, exclusive=False):
+        # Réplicas e seus rebalanceadores escrevem no mesmo arquivo: o lock de arquivo
+        # serializa o read-modify-write entre processos, o threading.Lock entre threads
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock, open(os.path.join(self.directory, 'moves.lock'), 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_df(self):
+        import pandas as pd
+        path = self.path
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path)
+        return pd.read_pickle(path, compression='gzip')
+
+    def _write_df(self, df):
+        import pandas as pd
+        for col in ID_COLUMNS:
+            if col in df.columns:
+                try:
+                    df[col] = pd.to_numeric(df[col]).astype('Int64')
+                except (ValueError, TypeError):
+                    pass  # ids não numéricos (ex.: UUID) ficam como texto
+        path = self.path
+        # Nome temporário por escritor: um rename nunca publica o arquivo parcial de outro
+        tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            if path.endswith('.parquet'):
+                df.to_parquet(tmp, compression='zstd', index=False)
+            else:
+                df.to_pickle(tmp, compression='gzip')
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def load(self):
+        import pandas as pd
+        with self._locked():
+            df = self._read_df()
+        if df.empty:
+            return []
+        # Parquet devolve NaN/NaT/<NA> para campos vazios; normaliza para None como o DB
+        return [{k: (None if pd.isna(v) else v) for k, v in row.items()} for row in df.to_dict('records')]
+
+    def append(self, moves):
+        """Adiciona OS ao arquivo, substituindo versões anteriores com o mesmo id."""
+        if not moves:
+            return 0
+        import pandas as pd
+        with self._locked(exclusive=True):
+            current = self._read_df()
+            new = pd.DataFrame(moves)
+            if not current.empty:
+                current = current[~current['id'].astype(str).isin(new['id'].astype(str))]
+                new = pd.concat([current, new], ignore_index=True)
+            self._write_df(new)
+        return len(moves)
+
+    def archive_id(self):
+        """Identidade do diretório do arquivo, criada no primeiro uso: processos que enxergam
+        o mesmo diretório (o mesmo volume compartilhado) recebem o mesmo id."""
+        path = os.path.join(self.directory, 'archive.id')
+        with self._locked(exclusive=True):
+            if os.path.exists(path):
+                with open(path) as f:
+                    return f.read().strip()
+            value = uuid.uuid4().hex
+            with open(path, 'w') as f:
+                f.write(value)
+            return value
+
+    def repoint_resident(self, survivor_id, duplicate_ids):
+        """Aplica ao arquivo a mesma troca de residentId feita no DB ao mesclar moradores."""
+        dup = {str(d) for d in duplicate_ids}
+        with self._locked(exclusive=True):
+            df = self._read_df()
+            if df.empty:
+                return 0
+            mask = df['residentId'].astype(str).isin(dup)
+            if mask.any():
+                df.loc[mask, 'residentId'] = survivor_id
+                self._write_df(df)
+            return int(mask.sum())
+
+    def query(self, name=None, status=None, start=None, end=None, scope=None, residents=None, exclude_ids=()):
+        """Consulta o arquivo com os mesmos filtros da busca do dashboard.
+
+        `exclude_ids` recebe os ids do hot tier: uma OS reaberta no DB depois de arquivada
+        aparece só na versão atual, não também como a cópia "Concluído" do arquivo."""
+        exclude = {str(i) for i in exclude_ids}
+        moves = [m for m in self.load() if str(m.get('id')) not in exclude]
+        if scope is not None:
+            moves = [m for m in moves if str(m.get('secretaryId')) == str(scope)]
+        if status and status != 'Todos':
+            moves = [m for m in moves if m.get('status') == status]
+        if start:
+            moves = [m for m in moves if str(m.get('date')) >= str(start)]
+        if end:
+            moves = [m for m in moves if str(m.get('date')) <= str(end)]
+        if name and residents is not None:
+            names = {str(r['id']): r['name'] for r in residents}
+            moves = [m for m in moves if name.lower() in names.get(str(m.get('residentId')), '').lower()]
+        return moves
+
+
+archive = MoveArchive()
+
+
+class TierRebalancer(threading.Thread):
+    """Job em segundo plano que periodicamente busca no DB as OS que esfriaram, copia
+    para o arquivo e só então as marca como arquivadas (o hot tier deixa de trazê-las)."""
+
+    def __init__(self, fetch_candidates, mark_archived, on_archived=None, interval=3600):
+        super().__init__(daemon=True, name='telemim-tier-rebalancer')
+        self.fetch_candidates = fetch_candidates
+        self.mark_archived = mark_archived
+        self.on_archived = on_archived
+        self.interval = interval
+        self.last_run = None
+        self.last_archived = 0
+        self._stop_event = threading.Event()
+
+    def run_once(self):
+        moves = self.fetch_candidates(str(archive_cutoff()))
+        if moves:
+            archive.append(moves)
+            ids = [m['id'] for m in moves]
+            if self.mark_archived(ids) and self.on_archived:
+                self.on_archived(ids)
+        self.last_archived = len(moves)
+        self.last_run = datetime.now()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Erro ao rebalancear o arquivo de OS")
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def start_rebalancer(fetch_candidates, mark_archived, on_archived=None, interval=3600):
+    rebalancer = TierRebalancer(fetch_candidates, mark_archived, on_archived, interval)
+    rebalancer.start()
+    return rebalancer